@@ -0,0 +1,130 @@
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, List, Optional
+
+import asyncio
+import os
+import resource
+from contextlib import asynccontextmanager
+from unittest import mock
+
+import numpy as np
+import pytest
+
+for name, value in {
+    "MINIO_HOST": "localhost",
+    "MINIO_PORT": "9000",
+    "MINIO_REGION_NAME": "benchmark",
+    "MINIO_BUCKET_NAME": "benchmark",
+    "MINIO_ACCESS_KEY": "benchmark",
+    "MINIO_SECRET_KEY": "benchmark",
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_PORT": "5432",
+    "POSTGRES_DB": "benchmark",
+    "POSTGRES_USER": "benchmark",
+    "POSTGRES_PASSWORD": "benchmark",
+}.items():
+    os.environ.setdefault(name, value)
+
+from bertopic import BERTopic  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from pytest_benchmark.fixture import BenchmarkFixture  # noqa: E402
+from sklearn.datasets import fetch_20newsgroups  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+from service.api import deps  # noqa: E402
+from service.api.endpoints.modeling import gather_topics  # noqa: E402
+from service.api.utils import save_model  # noqa: E402
+from service.main import app  # noqa: E402
+from service.models.models import ModelChunk, Topic, TopicCreate, TopicModel, Word  # noqa: E402
+from tests.fakes import FakeS3, SQLiteDatabase  # noqa: E402
+
+CORPUS_SIZES = [100, 1000]
+
+
+@pytest.fixture(scope="session")
+def fake_s3() -> FakeS3:
+    return FakeS3()
+
+
+@pytest.fixture(scope="session")
+def database() -> Generator[SQLiteDatabase, None, None]:
+    db = SQLiteDatabase()
+    yield db
+    db.close()
+
+
+@pytest.fixture(scope="session")
+def client(fake_s3: FakeS3, database: SQLiteDatabase) -> Generator[TestClient, None, None]:
+    async def get_s3() -> AsyncGenerator[FakeS3, None]:
+        yield fake_s3
+
+    app.dependency_overrides[deps.get_s3] = get_s3
+    app.dependency_overrides[deps.get_db_async] = database.get_db_async
+    # models kept in memory are loaded with a client of their own
+    with mock.patch.object(deps, "create_s3_client", asynccontextmanager(get_s3)):
+        with TestClient(app=app) as client:
+            yield client
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture(scope="session")
+def corpus() -> List[str]:
+    dataset = fetch_20newsgroups(subset="all", remove=("headers", "footers", "quotes"))["data"]
+    return [doc for doc in dataset if len(doc) > 0][: max(CORPUS_SIZES)]
+
+
+@pytest.fixture(scope="session")
+def dummy_model() -> BERTopic:
+    return BERTopic.load("tests/assets/model.mdl")
+
+
+@pytest.fixture(scope="session")
+def stored_model(
+    fake_s3: FakeS3, database: SQLiteDatabase, dummy_model: BERTopic
+) -> Dict[str, Any]:
+    """Upload test model to the fake storage and register it with its topics in the database"""
+    model_id, chunks = asyncio.run(save_model(fake_s3, dummy_model))  # type: ignore
+    with Session(database.engine) as session:
+        model = TopicModel(model_id=model_id, version=1)
+        model.chunks = [ModelChunk(digest=digest) for digest in chunks]
+        session.add(model)
+        session.commit()
+        session.refresh(model)
+        for topic in gather_topics(dummy_model):
+            db_topic = Topic.from_orm(TopicCreate.parse_obj({**topic, "topic_model_id": model.id}))
+            session.add(db_topic)
+            for word in topic["top_words"]:
+                session.add(Word.parse_obj({**word, "topic": db_topic}))
+        session.commit()
+    return {"model_id": str(model_id), "version": 1}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@pytest.fixture()
+def measure(benchmark: BenchmarkFixture) -> Callable[..., Any]:
+    """
+    Run `benchmark` and add p50/p99 latency, throughput and peak RSS to the saved results.
+    Expensive calls should pass `rounds` to run them a fixed number of times.
+    """
+
+    def run(fn: Callable[[], Any], n_docs: int = 1, rounds: Optional[int] = None) -> Any:
+        if rounds is None:
+            result = benchmark(fn)
+        else:
+            result = benchmark.pedantic(fn, rounds=rounds, iterations=1)
+        if benchmark.stats is not None:
+            data = benchmark.stats.stats.data
+            mean = float(np.mean(data))
+            benchmark.extra_info.update(
+                p50=float(np.percentile(data, 50)),
+                p99=float(np.percentile(data, 99)),
+                requests_per_second=1 / mean,
+                docs_per_second=n_docs / mean,
+                peak_rss_mb=peak_rss_mb(),
+            )
+        return result
+
+    return run
@@ -0,0 +1,106 @@
+"""
+Load generator for a running service.
+
+Sends the same request with a fixed concurrency and reports latency percentiles and throughput,
+e.g. for predictions with 8 concurrent clients:
+
+    python -m benchmarks.load http://localhost:8008/modeling/<model_id>/predicting \
+        --payload predict.json --concurrency 8 --requests 200 --pid <server pid> \
+        --output predict.json
+"""
+from typing import Any, Dict, List, Optional
+
+import argparse
+import asyncio
+import json
+import subprocess
+import time
+
+import httpx
+import numpy as np
+
+
+async def send_requests(
+    url: str, payload: Optional[Dict[str, Any]], concurrency: int, n_requests: int
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(n_requests):
+        queue.put_nowait(i)
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            if payload is None:
+                response = await client.get(url)
+            else:
+                response = await client.post(url, json=payload)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=None) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": n_requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50": float(np.percentile(latencies, 50)),
+        "p99": float(np.percentile(latencies, 99)),
+        "requests_per_second": n_requests / elapsed,
+    }
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """Peak resident set size of a local process, Linux only"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("url", help="Endpoint URL")
+    parser.add_argument("--payload", help="JSON file with request body, GET is sent without it")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--pid", type=int, help="Server process to report peak RSS for")
+    parser.add_argument("--output", help="Save results to this JSON file")
+    args = parser.parse_args()
+
+    payload = None
+    if args.payload:
+        with open(args.payload) as f:
+            payload = json.load(f)
+
+    results = asyncio.run(send_requests(args.url, payload, args.concurrency, args.requests))
+    results.update(url=args.url, commit=current_commit())
+    if args.pid:
+        results["peak_rss_mb"] = peak_rss_mb(args.pid)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import asyncio
+import uuid
+
+import numpy as np
+import pytest
+from bertopic import BERTopic
+from pytest_benchmark.fixture import BenchmarkFixture
+from pytest_mock import MockFixture
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from service.api.endpoints.modeling import persist_model
+from service.api.utils import get_model_filename, load_model, save_model
+from service.core.config import settings
+from service.core.residency import deep_sizeof
+from tests.fakes import FakeS3, SQLiteDatabase
+
+pytestmark = pytest.mark.benchmark
+
+CODECS = [("none", None), ("lz4", None), ("zstd", 3), ("zstd", 9)]
+
+
+def chunk_bytes(s3: FakeS3) -> int:
+    """Stored size of all model chunks, manifests are negligible"""
+    return sum(
+        len(obj["Body"])
+        for key, obj in s3.objects.items()
+        if key.startswith(settings.CHUNK_PREFIX)
+    )
+
+
+@pytest.mark.parametrize("codec, level", CODECS)
+def test_save_model(
+    benchmark: BenchmarkFixture,
+    dummy_model: BERTopic,
+    mocker: MockFixture,
+    codec: str,
+    level: int,
+) -> None:
+    mocker.patch("service.api.utils.settings.MODEL_CODEC", codec)
+    mocker.patch("service.api.utils.settings.MODEL_CODEC_LEVEL", level)
+    s3 = FakeS3()
+    model_id = uuid.uuid4()
+
+    benchmark.pedantic(
+        lambda: asyncio.run(save_model(s3, dummy_model, model_id)), rounds=3, iterations=1
+    )
+    benchmark.extra_info.update(
+        artifact_bytes=chunk_bytes(s3),
+        uncompressed_bytes=int(s3.objects[get_model_filename(model_id)]["Metadata"]["size"]),
+    )
+
+
+@pytest.mark.parametrize("codec, level", CODECS)
+def test_load_model(
+    benchmark: BenchmarkFixture,
+    dummy_model: BERTopic,
+    mocker: MockFixture,
+    codec: str,
+    level: int,
+) -> None:
+    mocker.patch("service.api.utils.settings.MODEL_CODEC", codec)
+    mocker.patch("service.api.utils.settings.MODEL_CODEC_LEVEL", level)
+    s3 = FakeS3()
+    model_id, _ = asyncio.run(save_model(s3, dummy_model))
+
+    benchmark.pedantic(lambda: asyncio.run(load_model(s3, model_id)), rounds=3, iterations=1)
+    benchmark.extra_info.update(artifact_bytes=chunk_bytes(s3))
+
+
+@pytest.mark.parametrize("precision", ["full", "float16", "int8"])
+def test_embedding_precision(
+    benchmark: BenchmarkFixture, dummy_model: BERTopic, mocker: MockFixture, precision: str
+) -> None:
+    mocker.patch("service.api.utils.settings.EMBEDDING_PRECISION", precision)
+    s3 = FakeS3()
+    model_id, _ = asyncio.run(save_model(s3, dummy_model))
+
+    serving_model = benchmark.pedantic(
+        lambda: asyncio.run(load_model(s3, model_id, serving=True)), rounds=3, iterations=1
+    )
+    words = [word for topic in dummy_model.get_topics().values() for word, _ in topic]
+    rng = np.random.default_rng(0)
+    docs = [" ".join(rng.choice(words, size=30)) for _ in range(1000)]
+    topics, _ = dummy_model.transform(docs)
+    reduced_topics, _ = serving_model.transform(docs)
+    benchmark.extra_info.update(
+        artifact_bytes=chunk_bytes(s3),
+        resident_bytes=deep_sizeof(serving_model),
+        topic_agreement=float(np.mean(np.array(reduced_topics) == np.array(topics))),
+    )
+
+
+@pytest.mark.parametrize("latency", [0, 0.05])
+def test_persist_model(benchmark: BenchmarkFixture, dummy_model: BERTopic, latency: float) -> None:
+    s3 = FakeS3(latency=latency)
+    database = SQLiteDatabase()
+
+    async def persist() -> None:
+        async with AsyncSession(database.engine_async) as session:
+            await persist_model(s3, session, dummy_model, uuid.uuid4())
+        # connections are bound to the event loop of the round
+        await database.engine_async.dispose()
+
+    try:
+        benchmark.pedantic(lambda: asyncio.run(persist()), rounds=3, iterations=1)
+    finally:
+        database.close()
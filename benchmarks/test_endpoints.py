@@ -0,0 +1,132 @@
+from typing import Any, Callable, Dict, List
+
+from collections import OrderedDict
+
+import pytest
+from fastapi.testclient import TestClient
+from pytest_mock import MockFixture
+
+from service.core.predictions import prediction_cache
+
+from .conftest import CORPUS_SIZES
+
+pytestmark = pytest.mark.benchmark
+
+
+def post(client: TestClient, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    response = client.post(url, json=payload)
+    assert response.status_code == 200, response.text
+    result: Dict[str, Any] = response.json()
+    return result
+
+
+@pytest.fixture(scope="module")
+def predictions(
+    client: TestClient, stored_model: Dict[str, Any], corpus: List[str]
+) -> Dict[str, Any]:
+    texts = corpus[: min(CORPUS_SIZES)]
+    result = post(
+        client,
+        f"/modeling/{stored_model['model_id']}/predicting",
+        {"model": stored_model, "texts": texts, "calculate_probabilities": True},
+    )
+    return {"texts": texts, **result}
+
+
+@pytest.mark.parametrize("n_docs", CORPUS_SIZES)
+@pytest.mark.parametrize("nr_topics", [None, 5, 20])
+def test_fit(
+    client: TestClient,
+    corpus: List[str],
+    measure: Callable[..., Any],
+    n_docs: int,
+    nr_topics: Any,
+) -> None:
+    payload = {"texts": corpus[:n_docs], "nr_topics": nr_topics}
+    measure(lambda: post(client, "/modeling/training", payload), n_docs=n_docs, rounds=1)
+
+
+@pytest.mark.parametrize("cached", [False, True])
+@pytest.mark.parametrize("n_docs", [1, *CORPUS_SIZES])
+def test_predict(
+    client: TestClient,
+    stored_model: Dict[str, Any],
+    corpus: List[str],
+    measure: Callable[..., Any],
+    mocker: MockFixture,
+    n_docs: int,
+    cached: bool,
+) -> None:
+    # the cache is filled by the first round
+    mocker.patch.object(prediction_cache, "entries", OrderedDict())
+    mocker.patch.object(prediction_cache, "used", 0)
+    if not cached:
+        mocker.patch.object(prediction_cache, "max_bytes", 0)
+    payload = {"model": stored_model, "texts": corpus[:n_docs]}
+    url = f"/modeling/{stored_model['model_id']}/predicting"
+    measure(lambda: post(client, url, payload), n_docs=n_docs)
+
+
+@pytest.mark.parametrize("num_topics", [2, 5])
+def test_reduce_topics(
+    client: TestClient,
+    stored_model: Dict[str, Any],
+    predictions: Dict[str, Any],
+    measure: Callable[..., Any],
+    num_topics: int,
+) -> None:
+    payload = {"model": stored_model, "num_topics": num_topics, **predictions}
+    url = f"/modeling/{stored_model['model_id']}/reducting"
+    measure(lambda: post(client, url, payload), n_docs=len(predictions["texts"]), rounds=5)
+
+
+@pytest.mark.parametrize("vectorizer_params", [None, {"stop_words": "english"}])
+def test_update_topics(
+    client: TestClient,
+    stored_model: Dict[str, Any],
+    predictions: Dict[str, Any],
+    measure: Callable[..., Any],
+    vectorizer_params: Any,
+) -> None:
+    payload = {
+        "model": stored_model,
+        "texts": predictions["texts"],
+        "topics": predictions["topics"],
+        "vectorizer_params": vectorizer_params,
+    }
+    url = f"/modeling/{stored_model['model_id']}/updating"
+    measure(lambda: post(client, url, payload), n_docs=len(predictions["texts"]), rounds=5)
+
+
+def test_list_models(
+    client: TestClient, stored_model: Dict[str, Any], measure: Callable[..., Any]
+) -> None:
+    def list_models() -> None:
+        assert client.get("/models/").status_code == 200
+
+    measure(list_models)
+
+
+@pytest.mark.parametrize(
+    "endpoint, params",
+    [
+        ("topics", {"topics": [0]}),
+        ("barchart", {"top_n_topics": 2}),
+        ("hierarchy", {"top_n_topics": 2}),
+        ("heatmap", {"top_n_topics": 2}),
+        ("distribution", {}),
+        ("term_rank", {"topics": [0, 1]}),
+    ],
+)
+def test_visualization(
+    client: TestClient,
+    stored_model: Dict[str, Any],
+    predictions: Dict[str, Any],
+    measure: Callable[..., Any],
+    endpoint: str,
+    params: Dict[str, Any],
+) -> None:
+    payload = {"model": stored_model, **params}
+    if endpoint == "distribution":
+        payload["probabilities"] = predictions["probabilities"][0]
+    measure(lambda: post(client, f"/visualizations/{endpoint}", payload))
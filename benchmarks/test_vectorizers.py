@@ -0,0 +1,42 @@
+from typing import Any, Callable, List
+
+import tracemalloc
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from service.schemas.bertopic_wrapper import VectorizerParams, build_vectorizer
+
+from .conftest import CORPUS_SIZES
+
+pytestmark = pytest.mark.benchmark
+
+VECTORIZERS = {
+    "count": {},
+    "hashed": {"n_features": 2**18},
+    "pruned": {"max_vocabulary": 20_000},
+}
+
+
+@pytest.mark.parametrize("n_docs", CORPUS_SIZES)
+@pytest.mark.parametrize("vectorizer", list(VECTORIZERS))
+def test_vectorize(
+    benchmark: BenchmarkFixture,
+    corpus: List[str],
+    measure: Callable[..., Any],
+    n_docs: int,
+    vectorizer: str,
+) -> None:
+    params = VectorizerParams(ngram_range=[1, 3], **VECTORIZERS[vectorizer])
+    docs = corpus[:n_docs]
+
+    def fit_transform() -> Any:
+        return build_vectorizer(params).fit_transform(docs)
+
+    # peak of allocations made by the vectorizer, RSS only grows over the session
+    tracemalloc.start()
+    X = fit_transform()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    measure(fit_transform, n_docs=n_docs, rounds=3)
+    benchmark.extra_info.update(peak_traced_mb=peak / 2**20, n_features=X.shape[1])
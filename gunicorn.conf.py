@@ -0,0 +1,38 @@
+"""
+Gunicorn settings, see https://docs.gunicorn.org/en/stable/settings.html
+
+The app and PRELOAD_MODELS are loaded in the master process before workers are forked, so
+workers share model memory copy-on-write instead of deserializing their own copies.
+"""
+import gc
+import os
+import shutil
+
+# must be set before prometheus_client is imported to aggregate metrics of all workers
+metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/bertopic_metrics")
+
+from service.core.config import settings  # noqa: E402
+
+bind = "0.0.0.0:8000"
+workers = settings.WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+
+def on_starting(server):
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+    from service.api.warmup import preload_models
+
+    preload_models()
+    # move everything loaded so far to the permanent generation: the collector won't
+    # traverse these objects in workers and write to their pages, breaking sharing
+    gc.collect()
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,4 @@
+import time
+
+# reference point for measuring how long application import takes
+IMPORT_STARTED = time.perf_counter()
@@ -0,0 +1,131 @@
+from typing import Optional
+
+import json
+import random
+
+import httpx
+from fastapi.exceptions import HTTPException
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+
+from ..core import affinity
+from ..core.config import settings
+from ..core.metrics import AFFINITY_REQUESTS, timed
+from ..schemas.base import ModelId
+from .streaming import is_json
+
+# set on forwarded requests, they are served by the receiving replica
+HOP_HEADER = "x-affinity-hop"
+# connection and body framing headers aren't passed on, the body is re-encoded
+SKIPPED_HEADERS = {
+    "accept-encoding",
+    "connection",
+    "content-encoding",
+    "content-length",
+    "host",
+    "keep-alive",
+    "proxy-connection",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    # created on first use to bind to the running event loop
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                settings.AFFINITY_TIMEOUT, connect=settings.AFFINITY_CONNECT_TIMEOUT
+            )
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class Forwarded(Exception):
+    """Response of the replica owning the requested model version"""
+
+    def __init__(self, response: Response) -> None:
+        self.response = response
+
+
+async def forwarded_response(request: Request, exc: Forwarded) -> Response:
+    return exc.response
+
+
+async def forward(request: Request, peer: str, content: bytes) -> Response:
+    headers = {
+        name: value for name, value in request.headers.items() if name not in SKIPPED_HEADERS
+    }
+    headers[HOP_HEADER] = settings.AFFINITY_SELF or ""
+    with timed("forward"):
+        response = await get_client().request(
+            request.method,
+            peer.rstrip("/") + request.url.path,
+            params=request.url.query,
+            headers=headers,
+            content=content,
+        )
+    return Response(
+        content=response.content,
+        status_code=response.status_code,
+        headers={
+            name: value for name, value in response.headers.items() if name not in SKIPPED_HEADERS
+        },
+    )
+
+
+async def route_model(request: Request) -> None:
+    """
+    Dependency forwarding requests for a model version in `model` of the body to a replica owning
+    it, so every model is loaded by a bounded number of replicas. It runs before admission, the
+    forwarding replica doesn't hold a slot. Requests are served here if this replica owns the
+    model, routing is disabled, or no owner is reachable.
+    """
+    if not affinity.enabled():
+        return
+    if HOP_HEADER in request.headers:
+        AFFINITY_REQUESTS.labels(result="local").inc()
+        return
+    # missing and invalid bodies are rejected by validation of the endpoint
+    if not is_json(request) or not await request.body():
+        return
+    try:
+        body = await request.json()
+        model = ModelId.parse_obj(body["model"])
+    except (json.JSONDecodeError, KeyError, TypeError, ValidationError):
+        return
+    local, owners = await affinity.route(model.model_id, model.version)
+    if local:
+        AFFINITY_REQUESTS.labels(result="local").inc()
+        return
+
+    # the raw body isn't kept by streamed routes, the parsed one is sent
+    content = await run_in_threadpool(lambda: json.dumps(body).encode())
+    # load is spread between owners
+    for peer in random.sample(owners, len(owners)):
+        try:
+            response = await forward(request, peer, content)
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            AFFINITY_REQUESTS.labels(result="unreachable").inc()
+            continue
+        except httpx.HTTPError as error:
+            raise HTTPException(
+                status_code=502, detail=f"Replica {peer} failed: {error!r}"
+            ) from error
+        AFFINITY_REQUESTS.labels(result="forwarded").inc()
+        raise Forwarded(response)
+    AFFINITY_REQUESTS.labels(result="local").inc()
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from .endpoints import base, modeling, models, visualization
+from .endpoints import admin, base, modeling, models, visualization
 
 tags_metadata = [
     {
@@ -19,6 +19,10 @@ tags_metadata = [
         "name": "visualization",
         "description": "Topics visualizations",
     },
+    {
+        "name": "admin",
+        "description": "Service internals, per worker process",
+    },
 ]
 
 api_router = APIRouter()
@@ -26,3 +30,4 @@ api_router.include_router(base.router)
 api_router.include_router(models.router)
 api_router.include_router(modeling.router)
 api_router.include_router(visualization.router)
+api_router.include_router(admin.router)
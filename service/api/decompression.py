@@ -0,0 +1,200 @@
+from typing import Any, Iterator, List
+
+import zlib
+
+from fastapi.exceptions import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..core.config import settings
+
+ENCODINGS = ("gzip", "x-gzip", "zstd")
+# compressed gzip bytes decompressed at once, deflate expands at most 1032 times, so this bounds
+# the output of a single step of decompression bombs
+DECOMPRESS_STEP = 2**12
+# magic numbers of zstd frames and skippable frames, which go up to 0x184D2A5F
+ZSTD_MAGIC = 0xFD2FB528
+SKIPPABLE_MAGIC = 0x184D2A50
+# sizes of the frame content size and dictionary id fields by their flags
+CONTENT_SIZE_BYTES = (0, 2, 4, 8)
+DICTIONARY_ID_BYTES = (0, 1, 2, 4)
+
+
+def create_decompressor(encoding: str) -> Any:
+    if encoding == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompressobj()
+    # 16 + MAX_WBITS expects a gzip header and trailer
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+class ZstdBlocks:
+    """
+    Split a zstd stream after every block. A block decompresses to at most 128 KiB, but an RLE
+    block does so from 4 bytes, so steps of input bytes don't bound the output, decompressing the
+    pieces one at a time does. Only the framing is parsed, after anything unexpected the data is
+    passed on as is for the decompressor to reject.
+    """
+
+    def __init__(self) -> None:
+        self.state = "magic"
+        # header being received, the size of a frame header is known from its first byte
+        self.header = b""
+        # bytes left of the current block with the checksum after the last one, or skipped frame
+        self.remaining = 0
+        self.checksum = False
+        self.in_block = False
+        self.invalid = False
+
+    def header_size(self) -> int:
+        if self.state in ("magic", "skippable"):
+            return 4
+        if self.state == "block":
+            return 3
+        if not self.header:
+            return 1
+        descriptor = self.header[0]
+        single_segment = descriptor >> 5 & 1
+        # single segment frames have no window descriptor and at least 1 byte of content size
+        content_size = CONTENT_SIZE_BYTES[descriptor >> 6] or single_segment
+        return 2 - single_segment + DICTIONARY_ID_BYTES[descriptor & 3] + content_size
+
+    def parse_header(self) -> None:
+        value = int.from_bytes(self.header, "little")
+        self.header = b""
+        if self.state == "magic":
+            if value == ZSTD_MAGIC:
+                self.state = "frame"
+            elif value & 0xFFFFFFF0 == SKIPPABLE_MAGIC:
+                self.state = "skippable"
+            else:
+                self.invalid = True
+        elif self.state == "skippable":
+            self.remaining = value
+            self.state = "magic"
+        elif self.state == "frame":
+            self.checksum = bool(value >> 2 & 1)
+            self.state = "block"
+        else:
+            last, block_type, size = value & 1, value >> 1 & 3, value >> 3
+            # RLE blocks are a single byte repeated `size` times
+            self.remaining = 1 if block_type == 1 else size
+            if last:
+                self.remaining += 4 * self.checksum
+                self.state = "magic"
+            self.in_block = True
+
+    def split(self, data: bytes) -> Iterator[bytes]:
+        start = pos = 0
+        while pos < len(data) and not self.invalid:
+            if self.remaining:
+                step = min(self.remaining, len(data) - pos)
+                pos += step
+                self.remaining -= step
+            else:
+                missing = data[pos : pos + self.header_size() - len(self.header)]
+                self.header += missing
+                pos += len(missing)
+                if len(self.header) == self.header_size():
+                    self.parse_header()
+            if self.in_block and not self.remaining:
+                self.in_block = False
+                yield data[start:pos]
+                start = pos
+        if start < len(data):
+            yield data[start:]
+
+
+class Decompressor:
+    """Decompress a request body as it is received, rejecting bodies over REQUEST_BODY_LIMIT"""
+
+    def __init__(self, encoding: str) -> None:
+        self.encoding = encoding
+        self.decompressor = create_decompressor(encoding)
+        self.blocks = ZstdBlocks() if encoding == "zstd" else None
+        self.size = 0
+
+    def steps(self, data: bytes) -> Iterator[bytes]:
+        """Pieces of `data` decompressed at once"""
+        if self.blocks is not None:
+            return self.blocks.split(data)
+        return (
+            data[start : start + DECOMPRESS_STEP] for start in range(0, len(data), DECOMPRESS_STEP)
+        )
+
+    def decompress(self, data: bytes) -> bytes:
+        output: List[bytes] = []
+        try:
+            for chunk in self.steps(data):
+                while chunk:
+                    if self.decompressor.eof:
+                        # concatenated gzip members and zstd frames are decompressed in turn
+                        self.decompressor = create_decompressor(self.encoding)
+                    output.append(self.decompressor.decompress(chunk))
+                    chunk = self.decompressor.unused_data if self.decompressor.eof else b""
+                    self.size += len(output[-1])
+                    if self.size > settings.REQUEST_BODY_LIMIT:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"Request body is over {settings.REQUEST_BODY_LIMIT} bytes",
+                        )
+        except HTTPException:
+            raise
+        except Exception as error:
+            # zlib.error or zstandard.ZstdError, zstandard is imported on first use
+            raise HTTPException(status_code=400, detail=f"Invalid {self.encoding} body") from error
+        return b"".join(output)
+
+    def finish(self) -> None:
+        if not self.decompressor.eof:
+            raise HTTPException(status_code=400, detail=f"Truncated {self.encoding} body")
+
+
+class DecompressionMiddleware:
+    """
+    Decompress request bodies with `Content-Encoding: gzip` or `zstd` while they are received,
+    the endpoint sees an uncompressed body. Errors are raised as HTTPException when the body is
+    read, so they are returned like errors of the endpoint.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = Headers(scope=scope).get("content-encoding", "identity").strip().lower()
+        if encoding == "identity":
+            await self.app(scope, receive, send)
+            return
+
+        if encoding not in ENCODINGS:
+            response = JSONResponse(
+                {"detail": f"Unsupported Content-Encoding {encoding}"}, status_code=415
+            )
+            await response(scope, receive, send)
+            return
+
+        # the body length changes, the encoding is removed before the endpoint sees the headers
+        scope = dict(scope)
+        scope["headers"] = [
+            (name, value)
+            for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+        decompressor = Decompressor(encoding)
+
+        async def receive_decompressed() -> Message:
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            message = dict(message)
+            message["body"] = decompressor.decompress(message.get("body", b""))
+            if not message.get("more_body", False):
+                decompressor.finish()
+            return message
+
+        await self.app(scope, receive_decompressed, send)
@@ -1,7 +1,7 @@
 from typing import AsyncGenerator, Generator
 
 from aiobotocore.client import AioBaseClient
-from aiobotocore.session import get_session
+from aiobotocore.session import ClientCreatorContext, get_session
 from sqlmodel import Session
 from sqlmodel.ext.asyncio.session import AsyncSession
 
@@ -9,16 +9,20 @@ from ..core.config import settings
 from ..db.db import engine, engine_async
 
 
-async def get_s3() -> AsyncGenerator[AioBaseClient, None]:
+def create_s3_client() -> ClientCreatorContext:
     session = get_session()
-    async with session.create_client(
+    return session.create_client(
         "s3",
         region_name=settings.MINIO_REGION_NAME,
         endpoint_url=f"http://{settings.MINIO_HOST}:{settings.MINIO_PORT}",
         use_ssl=False,
         aws_secret_access_key=settings.MINIO_SECRET_KEY,
         aws_access_key_id=settings.MINIO_ACCESS_KEY,
-    ) as client:
+    )
+
+
+async def get_s3() -> AsyncGenerator[AioBaseClient, None]:
+    async with create_s3_client() as client:
         yield client
 
 
@@ -0,0 +1,33 @@
+from aiobotocore.session import ClientCreatorContext
+from fastapi import Depends
+from fastapi.routing import APIRouter
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ...core.residency import residency
+from ...schemas.base import GarbageCollection, Residency, ResidentModel
+from .. import deps
+from ..utils import collect_garbage
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/models", summary="Models kept in worker memory", response_model=Residency)
+async def resident_models() -> Residency:
+    models = []
+    for info in residency.info():
+        model_id, version = info.pop("key")
+        models.append(ResidentModel(model_id=model_id, version=version, **info))
+    return Residency(budget=residency.budget, used=residency.used, models=models)
+
+
+@router.post(
+    "/storage/gc",
+    summary="Delete stored artifacts of removed models",
+    response_model=GarbageCollection,
+)
+async def storage_gc(
+    s3: ClientCreatorContext = Depends(deps.get_s3),
+    session: AsyncSession = Depends(deps.get_db_async),
+) -> GarbageCollection:
+    objects, size = await collect_garbage(s3, session)
+    return GarbageCollection(objects=objects, size=size)
@@ -1,9 +1,56 @@
-from fastapi import APIRouter
-from fastapi.responses import RedirectResponse
+from typing import Union
 
-router = APIRouter(tags=["model_training"])
+from aiobotocore.session import ClientCreatorContext
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import JSONResponse, RedirectResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ...core.config import settings
+from ...core.metrics import render_metrics
+from ...schemas.base import Message
+from .. import deps
+
+router = APIRouter(tags=["base"])
 
 
 @router.get("/", include_in_schema=False)
 async def docs_redirect():
     return RedirectResponse(url="/docs")
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+@router.get("/health/live", summary="Liveness probe", response_model=Message)
+async def live() -> Message:
+    return Message(message="ok")
+
+
+@router.get(
+    "/health/ready",
+    summary="Readiness probe",
+    responses={503: {"model": Message}},
+    response_model=Message,
+)
+async def ready(
+    request: Request,
+    s3: ClientCreatorContext = Depends(deps.get_s3),
+    session: AsyncSession = Depends(deps.get_db_async),
+) -> Union[Message, JSONResponse]:
+    warmup = request.app.state.warmup
+    if not warmup.done():
+        return JSONResponse(status_code=503, content=dict(Message(message="Warming up")))
+    if warmup.exception() is not None:
+        message = f"Warm-up failed: {warmup.exception()!r}"
+        return JSONResponse(status_code=503, content=dict(Message(message=message)))
+    try:
+        await session.execute(text("SELECT 1"))
+        await s3.head_bucket(Bucket=settings.MINIO_BUCKET_NAME)
+    except Exception as e:
+        message = f"Dependency unavailable: {e!r}"
+        return JSONResponse(status_code=503, content=dict(Message(message=message)))
+    return Message(message="ok")
@@ -1,14 +1,22 @@
-from typing import Any, Dict, List
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple, cast
+
+import asyncio
+import uuid
+from contextlib import suppress
 
 import numpy as np
+import numpy.typing as npt
 from aiobotocore.session import ClientCreatorContext
-from bertopic import BERTopic
 from fastapi import Depends
 from fastapi.exceptions import HTTPException
 from fastapi.routing import APIRouter
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from ... import crud
+from ...core.admission import admit
+from ...core.metrics import timed
+from ...core.predictions import Prediction, prediction_cache
+from ...core.threads import thread_budget
 from ...models import models
 from ...schemas.base import (
     DocsWithPredictions,
@@ -16,16 +24,32 @@ from ...schemas.base import (
     Input,
     ModelId,
     ModelPrediction,
+    MultiPredictIn,
     PredictIn,
+    PredictResult,
+    UpdateTopicsIn,
 )
-from ...schemas.bertopic_wrapper import BERTopicWrapper
+from ...schemas.bertopic_wrapper import BERTopicWrapper, build_vectorizer
 from .. import deps
-from ..utils import get_sample_dataset, load_model, save_model
+from ..affinity import route_model
+from ..streaming import StreamedRoute
+from ..utils import (
+    deduplicate,
+    delete_models,
+    get_sample_dataset,
+    load_model,
+    save_model,
+    use_model,
+)
 
-router = APIRouter(prefix="/modeling", tags=["modeling"])
+if TYPE_CHECKING:
+    from bertopic import BERTopic
 
+# bodies with texts are parsed while they are received
+router = APIRouter(prefix="/modeling", tags=["modeling"], route_class=StreamedRoute)
 
-def gather_topics(topic_model: BERTopic) -> List[Dict[str, Any]]:
+
+def gather_topics(topic_model: "BERTopic") -> List[Dict[str, Any]]:
     topic_info = topic_model.get_topics()
     topics = []
     for topic_index, top_words in topic_info.items():
@@ -40,7 +64,77 @@ def gather_topics(topic_model: BERTopic) -> List[Dict[str, Any]]:
     return topics
 
 
-@router.post("/training", summary="Run topic modeling", response_model=FitResult)
+async def persist_model(
+    s3: ClientCreatorContext,
+    session: AsyncSession,
+    topic_model: "BERTopic",
+    model_id: uuid.UUID,
+    version: int = 1,
+) -> None:
+    """
+    Save model artifacts and its database records in one transaction. The version row is flushed
+    first to claim the version, then artifacts are uploaded while topics are written. Chunks are
+    locked until they are referenced, so removals of other versions keep them. On failure
+    the transaction is rolled back and the model manifests are deleted, chunks are left to
+    `collect_garbage` as other versions may share them.
+    """
+    with timed("persist_model"):
+        await crud.model_chunk.lock(session, shared=True)
+        model = await crud.topic_model.create(
+            session,
+            obj_in=models.TopicModelBase(model_id=model_id, version=version),
+            commit=False,
+        )
+        # assigned by the flush claiming the version
+        assert model.id is not None
+        upload = asyncio.ensure_future(save_model(s3, topic_model, model_id, version))
+        write = asyncio.ensure_future(
+            crud.topic.save_topics(
+                session, topics=gather_topics(topic_model), model=model, commit=False
+            )
+        )
+        try:
+            (_, chunks), _ = await asyncio.gather(upload, write)
+            await crud.model_chunk.create_many(
+                session, topic_model_id=model.id, digests=chunks, commit=False
+            )
+            await session.commit()
+        except BaseException:
+            # gather leaves the other task running on failure
+            upload.cancel()
+            write.cancel()
+            await asyncio.gather(upload, write, return_exceptions=True)
+            await session.rollback()
+            # artifacts left by a failed cleanup have no version row and are garbage collected
+            with suppress(Exception):
+                await delete_models(s3, [(model_id, version)])
+            raise
+
+
+def embed_documents(topic_model: "BERTopic", texts: List[str]) -> npt.NDArray[np.floating[Any]]:
+    """
+    Embed every distinct text once, duplicates get a copy of its embedding. Clustering and c-TF-IDF
+    still see every document, so duplicates keep their weight in topics and topic sizes.
+    """
+    from bertopic.backend._utils import select_backend
+
+    unique, inverse = deduplicate(texts)
+    topic_model.embedding_model = select_backend(
+        topic_model.embedding_model, language=topic_model.language
+    )
+    with timed("embed"):
+        embeddings: npt.NDArray[np.floating[Any]] = topic_model._extract_embeddings(
+            unique, method="document", verbose=topic_model.verbose
+        )
+    return embeddings[inverse]
+
+
+@router.post(
+    "/training",
+    summary="Run topic modeling",
+    response_model=FitResult,
+    dependencies=[Depends(admit("train"))],
+)
 async def fit(
     data: Input,
     s3: ClientCreatorContext = Depends(deps.get_s3),
@@ -49,16 +143,14 @@ async def fit(
     params = dict(data)
     texts = params.pop("texts")
     topic_model = BERTopicWrapper(**params).model
-    if texts:
-        topics, probs = topic_model.fit_transform(texts)
-    else:
-        docs = get_sample_dataset()
-        predicted_topics, probs = topic_model.fit_transform(docs)
+    docs = texts or get_sample_dataset()
+    with timed("fit"), thread_budget.job():
+        predicted_topics, probs = topic_model.fit_transform(
+            docs, embeddings=embed_documents(topic_model, docs)
+        )
 
-    model_id = await save_model(s3, topic_model)
-    model = await crud.topic_model.create(session, obj_in=models.TopicModelBase(model_id=model_id))
-    topics = gather_topics(topic_model)
-    await crud.topic.save_topics(session, topics=topics, model=model)
+    model_id = uuid.uuid4()
+    await persist_model(s3, session, topic_model, model_id)
 
     return FitResult(
         model=ModelId(
@@ -68,30 +160,102 @@ async def fit(
     )
 
 
+# embeddings of request documents by index and embedding model, the embedding model is kept
+# referenced so its id isn't reused by another one
+SharedEmbeddings = Dict[int, Tuple[Any, Dict[int, npt.NDArray[np.floating[Any]]]]]
+
+
+def embed(
+    topic_model: "BERTopic", texts: List[str], indices: List[int], shared: SharedEmbeddings
+) -> npt.NDArray[np.floating[Any]]:
+    """Embeddings of `texts` at `indices`, documents embedded by the same model are reused"""
+    embedding_model = topic_model.embedding_model
+    _, embedded = shared.setdefault(id(embedding_model), (embedding_model, {}))
+    missing = [i for i in indices if i not in embedded]
+    if missing:
+        with timed("embed"):
+            embeddings = topic_model._extract_embeddings(
+                [texts[i] for i in missing], method="document", verbose=topic_model.verbose
+            )
+        embedded.update(zip(missing, embeddings))
+    return np.vstack([embedded[i] for i in indices])
+
+
+async def predict_texts(
+    model_id: ModelId,
+    texts: List[str],
+    calculate_probabilities: bool,
+    shared: SharedEmbeddings,
+) -> ModelPrediction:
+    model = (model_id.model_id, model_id.version)
+    # duplicates are predicted once, `inverse` maps documents to distinct texts
+    texts, inverse = deduplicate(texts)
+    predictions = prediction_cache.get(model, texts, calculate_probabilities)
+    # only documents not predicted before are sent to the model
+    misses = [i for i, prediction in enumerate(predictions) if prediction is None]
+    if misses:
+        async with use_model(model_id.model_id, model_id.version) as topic_model:
+            topic_model.calculate_probabilities = calculate_probabilities
+            with thread_budget.job():
+                embeddings = embed(topic_model, texts, misses, shared)
+                with timed("transform"):
+                    topics, probabilities = topic_model.transform(
+                        [texts[i] for i in misses], embeddings=embeddings
+                    )
+        computed = prediction_cache.put(
+            model,
+            [texts[i] for i in misses],
+            calculate_probabilities,
+            topics,
+            probabilities if calculate_probabilities else None,
+        )
+        for i, prediction in zip(misses, computed):
+            predictions[i] = prediction
+
+    # every document is predicted at this point
+    results = [cast(Prediction, predictions[i]) for i in inverse]
+    if calculate_probabilities:
+        return ModelPrediction(
+            topics=[topic for topic, _ in results],
+            probabilities=[row.tolist() for _, row in results if row is not None],
+        )
+    return ModelPrediction(topics=[topic for topic, _ in results], probabilities=None)
+
+
 @router.post(
     "/{model_id}/predicting",
     summary="Predict with existing model",
     response_model=ModelPrediction,
+    dependencies=[Depends(route_model), Depends(admit("predict"))],
 )
-async def predict(
-    data: PredictIn,
-    s3: ClientCreatorContext = Depends(deps.get_s3),
-) -> ModelPrediction:
-    topic_model = await load_model(s3, data.model.model_id, data.model.version)
-    topic_model.calculate_probabilities = data.calculate_probabilities
-    topics, probabilities = topic_model.transform(data.texts)
-    print(probabilities)
-    if data.calculate_probabilities:
-        probabilities = probabilities.tolist()
-    else:
-        probabilities = None
-    return ModelPrediction(topics=topics, probabilities=probabilities)
+async def predict(data: PredictIn) -> ModelPrediction:
+    return await predict_texts(data.model, data.texts, data.calculate_probabilities, {})
+
+
+@router.post(
+    "/predicting",
+    summary="Predict with several existing models",
+    response_model=List[PredictResult],
+    dependencies=[Depends(admit("predict"))],
+)
+async def predict_many(data: MultiPredictIn) -> List[PredictResult]:
+    """
+    Predict `texts` with every model, models with the same embedding model share the embeddings.
+    Models are used one at a time, so a request never holds several models in memory.
+    """
+    shared: SharedEmbeddings = {}
+    results = []
+    for model in data.models:
+        predictions = await predict_texts(model, data.texts, data.calculate_probabilities, shared)
+        results.append(PredictResult(model=model, predictions=predictions))
+    return results
 
 
 @router.post(
     "/{model_id}/reducting",
     summary="Reduce number of topics in existing model",
     response_model=FitResult,
+    dependencies=[Depends(route_model), Depends(admit("train"))],
 )
 async def reduce_topics(
     data: DocsWithPredictions,
@@ -106,28 +270,72 @@ async def reduce_topics(
 
     if len(data.texts) == 0:
         data.texts = get_sample_dataset()
-    predicted_topics, probs = topic_model.reduce_topics(
-        docs=data.texts,
-        topics=data.topics,
-        probabilities=np.array(data.probabilities),
-        nr_topics=data.num_topics,
-    )
+    # reduce_topics merges topics assigned to the passed docs
+    topic_model.topics_ = data.topics
+    topic_model.probabilities_ = np.array(data.probabilities) if data.probabilities else None
+    with timed("reduce_topics"), thread_budget.job():
+        topic_model.reduce_topics(docs=data.texts, nr_topics=data.num_topics)
+    predicted_topics, probs = topic_model.topics_, topic_model.probabilities_
     current_max_version = await crud.topic_model.get_max_version(
         session, model_id=data.model.model_id
     )
 
-    model_id = await save_model(s3, topic_model, data.model.model_id, current_max_version + 1)
-
-    model = await crud.topic_model.create(
-        session, obj_in=models.TopicModelBase(model_id=model_id, version=current_max_version + 1)
-    )
-    topics = gather_topics(topic_model)
-    await crud.topic.save_topics(session, topics=topics, model=model)
+    model_id = data.model.model_id
+    await persist_model(s3, session, topic_model, model_id, current_max_version + 1)
 
     return FitResult(
         model=ModelId(
             model_id=model_id,
             version=current_max_version + 1,
         ),
-        predictions=ModelPrediction(topics=predicted_topics, probabilities=probs.tolist()),
+        predictions=ModelPrediction(
+            topics=predicted_topics, probabilities=probs.tolist() if probs is not None else None
+        ),
     )
+
+
+@router.post(
+    "/{model_id}/updating",
+    summary="Update topic representations of existing model",
+    response_model=ModelId,
+    dependencies=[Depends(route_model), Depends(admit("train"))],
+)
+async def update_topics(
+    data: UpdateTopicsIn,
+    s3: ClientCreatorContext = Depends(deps.get_s3),
+    session: AsyncSession = Depends(deps.get_db_async),
+) -> ModelId:
+    """
+    Recompute c-TF-IDF topic words with new vectorizer parameters or `top_n_words` and save them as
+    a new version. Documents keep their topics, embeddings, UMAP and HDBSCAN are reused as is.
+    """
+    topic_model = await load_model(s3, data.model.model_id, data.model.version)
+    # training documents aren't stored, like fit the sample dataset is used without texts
+    texts = data.texts or get_sample_dataset()
+    topics = data.topics if data.topics is not None else topic_model.topics_
+    if len(topics) != len(texts):
+        raise HTTPException(
+            status_code=400, detail=f"texts must match {len(topics)} topic assignments"
+        )
+
+    vectorizer_model = (
+        build_vectorizer(data.vectorizer_params)
+        if data.vectorizer_params
+        else topic_model.vectorizer_model
+    )
+    with timed("update_topics"), thread_budget.job():
+        topic_model.update_topics(
+            texts,
+            topics=data.topics,
+            top_n_words=data.top_n_words,
+            vectorizer_model=vectorizer_model,
+            ctfidf_model=topic_model.ctfidf_model,
+        )
+    current_max_version = await crud.topic_model.get_max_version(
+        session, model_id=data.model.model_id
+    )
+
+    model_id = data.model.model_id
+    await persist_model(s3, session, topic_model, model_id, current_max_version + 1)
+
+    return ModelId(model_id=model_id, version=current_max_version + 1)
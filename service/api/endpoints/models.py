@@ -1,4 +1,6 @@
-from typing import List, Sequence, Union
+from typing import List, Optional, Sequence, Union
+
+import datetime
 
 from aiobotocore.session import ClientCreatorContext
 from fastapi import Depends, Path
@@ -12,11 +14,14 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 
 from ... import crud
 from ...api import deps
-from ...core.config import settings
+from ...core.admission import admit
+from ...core.predictions import prediction_cache
+from ...core.residency import residency
 from ...models import models
-from ...schemas.base import Message
+from ...schemas.base import Message, ModelId
+from ..utils import delete_models
 
-router = APIRouter(prefix="/models", tags=["models"])
+router = APIRouter(prefix="/models", tags=["models"], dependencies=[Depends(admit("metadata"))])
 
 
 @router.get(
@@ -68,9 +73,45 @@ async def remove_model(
     s3: ClientCreatorContext = Depends(deps.get_s3),
     session: AsyncSession = Depends(deps.get_db_async),
 ) -> Union[Message, JSONResponse]:
+    chunks = await crud.model_chunk.get_digests(session, model_id=model_id, version=version)
     try:
         await crud.topic_model.remove_by_id_version(session, model_id=model_id, version=version)
-        await s3.delete_object(Bucket=settings.MINIO_BUCKET_NAME, Key=str(model_id))
-    except (NoResultFound, s3.exceptions.NoSuchKey):
+    except NoResultFound:
         return JSONResponse(status_code=404, content=dict(Message(message="Model not found")))
+    await crud.model_chunk.lock(session)
+    referenced = await crud.model_chunk.get_referenced(session, digests=chunks)
+    await delete_models(s3, [(model_id, version)], set(chunks) - referenced)
+    await session.commit()
+    prediction_cache.discard((model_id, version))
+    await residency.discard((model_id, version))
     return Message(message="ok")
+
+
+@router.delete(
+    "/",
+    summary="Remove topic models in bulk",
+    responses={400: {"model": Message}},
+    response_model=List[ModelId],
+)
+async def remove_models(
+    model_id: Optional[UUID4] = None,
+    created_before: Optional[datetime.datetime] = None,
+    s3: ClientCreatorContext = Depends(deps.get_s3),
+    session: AsyncSession = Depends(deps.get_db_async),
+) -> Union[List[ModelId], JSONResponse]:
+    """Remove all versions of `model_id` and/or versions created before `created_before`"""
+    if model_id is None and created_before is None:
+        return JSONResponse(
+            status_code=400,
+            content=dict(Message(message="model_id or created_before must be provided")),
+        )
+    versions, chunks = await crud.topic_model.remove_many(
+        session, model_id=model_id, created_before=created_before
+    )
+    await crud.model_chunk.lock(session)
+    referenced = await crud.model_chunk.get_referenced(session, digests=chunks)
+    await delete_models(s3, versions, set(chunks) - referenced)
+    await session.commit()
+    prediction_cache.discard(*versions)
+    await residency.discard(*versions)
+    return [ModelId(model_id=removed, version=version) for removed, version in versions]
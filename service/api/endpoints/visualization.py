@@ -1,15 +1,19 @@
-from typing import Any, List
+from typing import TYPE_CHECKING, List
 
 import numpy as np
-from aiobotocore.session import ClientCreatorContext
 from fastapi import Depends
 from fastapi.exceptions import HTTPException
+from fastapi.responses import Response
 from fastapi.routing import APIRouter
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from ...api import deps
-from ...api.utils import load_model
+from ...api.affinity import route_model
+from ...api.utils import use_model
+from ...core.admission import admit
+from ...core.config import settings
+from ...core.metrics import timed
 from ...models import models
 from ...schemas.base import (
     ModelId,
@@ -21,10 +25,15 @@ from ...schemas.base import (
     VisTopicsInput,
 )
 
+if TYPE_CHECKING:
+    from plotly.graph_objects import Figure
+
 router = APIRouter(
     prefix="/visualizations",
     tags=["visualization"],
     responses={404: {"description": "Not found"}},
+    # requests are forwarded to a replica owning the model before they take a slot
+    dependencies=[Depends(route_model), Depends(admit("visualize"))],
 )
 
 
@@ -55,82 +64,97 @@ async def check_topics(
         )
 
 
+def figure_response(fig: "Figure") -> Response:
+    """Return already serialized figure as is, without JSON-encoding it a second time"""
+    if settings.STRIP_PLOTLY_TEMPLATE:
+        fig.layout.template = None
+    with timed("serialize_figure"):
+        content = fig.to_json()
+    return Response(content=content, media_type="application/json")
+
+
 @router.post("/topics", summary="Visualize topics, their sizes, and their corresponding words")
 async def topics(
     data: VisTopicsInput,
-    s3: ClientCreatorContext = Depends(deps.get_s3),
     session: AsyncSession = Depends(deps.get_db_async),
-) -> Any:
+) -> Response:
     params = dict(data)
     model = params.pop("model")
     if data.topics:
         await check_topics(model, data.topics, session)
-    topic_model = await load_model(s3, model.model_id, model.version)
-    return topic_model.visualize_topics(**params).to_json()
+    async with use_model(model.model_id, model.version) as topic_model:
+        with timed("visualize"):
+            fig = topic_model.visualize_topics(**params)
+    return figure_response(fig)
 
 
 @router.post("/barchart", summary="Visualize a barchart of selected topics")
 async def barchart(
     data: VisBarchartInput,
-    s3: ClientCreatorContext = Depends(deps.get_s3),
     session: AsyncSession = Depends(deps.get_db_async),
-) -> Any:
+) -> Response:
     params = dict(data)
     model = params.pop("model")
     if data.topics:
         await check_topics(model, data.topics, session)
-    topic_model = await load_model(s3, model.model_id, model.version)
-    return topic_model.visualize_barchart(**params).to_json()
+    async with use_model(model.model_id, model.version) as topic_model:
+        with timed("visualize"):
+            fig = topic_model.visualize_barchart(**params)
+    return figure_response(fig)
 
 
 @router.post("/hierarchy", summary="Visualize a hierarchical structure of the topics")
 async def hierarchy(
     data: VisHierarchyInput,
-    s3: ClientCreatorContext = Depends(deps.get_s3),
     session: AsyncSession = Depends(deps.get_db_async),
-) -> Any:
+) -> Response:
     params = dict(data)
     model = params.pop("model")
     if data.topics:
         await check_topics(model, data.topics, session)
-    topic_model = await load_model(s3, model.model_id, model.version)
-    return topic_model.visualize_hierarchy(**params).to_json()
+    async with use_model(model.model_id, model.version) as topic_model:
+        with timed("visualize"):
+            fig = topic_model.visualize_hierarchy(**params)
+    return figure_response(fig)
 
 
 @router.post("/heatmap", summary="Visualize a heatmap of the topic's similarity matrix")
 async def heatmap(
     data: VisHeatmapInput,
-    s3: ClientCreatorContext = Depends(deps.get_s3),
     session: AsyncSession = Depends(deps.get_db_async),
-) -> Any:
+) -> Response:
     params = dict(data)
     model = params.pop("model")
     if data.topics:
         await check_topics(model, data.topics, session)
-    topic_model = await load_model(s3, model.model_id, model.version)
-    return topic_model.visualize_heatmap(**params).to_json()
+    async with use_model(model.model_id, model.version) as topic_model:
+        with timed("visualize"):
+            fig = topic_model.visualize_heatmap(**params)
+    return figure_response(fig)
 
 
 @router.post("/distribution", summary="Visualize the distribution of topic probabilities")
 async def distribution(
     data: VisDistributionInput,
-    s3: ClientCreatorContext = Depends(deps.get_s3),
-) -> Any:
+) -> Response:
     params = dict(data)
     params["probabilities"] = np.array(data.probabilities)
     model = params.pop("model")
-    topic_model = await load_model(s3, model.model_id, model.version)
-    return topic_model.visualize_distribution(**params).to_json()
+    async with use_model(model.model_id, model.version) as topic_model:
+        with timed("visualize"):
+            fig = topic_model.visualize_distribution(**params)
+    return figure_response(fig)
 
 
 @router.post("/term_rank", summary="Visualize the ranks of all terms across all topics")
 async def term_rank(
     data: VisTermRankInput,
-    s3: ClientCreatorContext = Depends(deps.get_s3),
     session: AsyncSession = Depends(deps.get_db_async),
-) -> Any:
+) -> Response:
     params = dict(data)
     model = params.pop("model")
     await check_topics(model, data.topics, session)
-    topic_model = await load_model(s3, model.model_id, model.version)
-    return topic_model.visualize_term_rank(**params).to_json()
+    async with use_model(model.model_id, model.version) as topic_model:
+        with timed("visualize"):
+            fig = topic_model.visualize_term_rank(**params)
+    return figure_response(fig)
@@ -0,0 +1,60 @@
+from typing import List
+
+import asyncio
+import cProfile
+import marshal
+import uuid
+from contextlib import suppress
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..core.config import settings
+from .deps import create_s3_client
+
+
+class ProfilingMiddleware:
+    """
+    Run requests carrying the profiling header under cProfile.
+
+    Stats are saved to the bucket as `{PROFILING_PREFIX}{request_id}.prof` (pstats format,
+    open with `pstats.Stats` or snakeviz), the key is returned in the `X-Profile-Key` header.
+    The response is held until the stats are saved, the header is left out if saving failed.
+    Profiled requests are serialized, but other requests running on the event loop
+    at the same time are included into the profile.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.lock = asyncio.Lock()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or settings.PROFILING_HEADER not in Headers(scope=scope):
+            await self.app(scope, receive, send)
+            return
+
+        key = f"{settings.PROFILING_PREFIX}{uuid.uuid4().hex}.prof"
+        messages: List[Message] = []
+
+        async def send_wrapper(message: Message) -> None:
+            messages.append(message)
+
+        async with self.lock:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profiler.disable()
+            profiler.create_stats()
+            with suppress(Exception):
+                async with create_s3_client() as s3:
+                    await s3.put_object(
+                        Bucket=settings.MINIO_BUCKET_NAME,
+                        Key=key,
+                        Body=marshal.dumps(profiler.stats),
+                    )
+                # the first message starts the response
+                MutableHeaders(scope=messages[0])["X-Profile-Key"] = key
+        for message in messages:
+            await send(message)
@@ -0,0 +1,259 @@
+from typing import Any, Callable, Coroutine, Dict, List, Optional
+
+import codecs
+import email.message
+import json
+import re
+from json import decoder
+
+from fastapi.exceptions import HTTPException
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+from starlette.responses import Response
+
+from ..core.config import settings
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# characters ending a number or literal
+DELIMITER = re.compile(r"[ \t\n\r,\]}]")
+# separator after a text, the next text or the end of the array
+SEPARATOR = re.compile(r"[ \t\n\r]*([,\]])[ \t\n\r]*")
+# separator and the opening quote of the next text
+NEXT_TEXT = re.compile(r'[ \t\n\r]*,[ \t\n\r]*"')
+# C implementation of JSON string decoding used by json.loads, missing from type stubs
+scanstring = decoder.scanstring  # type: ignore[attr-defined]
+
+
+class Incomplete(Exception):
+    """The next value continues in the next chunk of the body"""
+
+
+class StreamParser:
+    """
+    Incremental parser of a JSON object with an array of strings under `field`.
+
+    The array is parsed text by text as chunks of the body are fed, texts over `max_length`
+    characters are rejected as soon as that many are received, and parsed data is released, so
+    the raw body is never kept whole. Other values are parsed whole when they are complete, up to
+    REQUEST_BODY_LIMIT characters. Syntax errors are raised as `json.JSONDecodeError` like
+    `json.loads` does.
+    """
+
+    def __init__(self, field: str = "texts", max_length: Optional[int] = None) -> None:
+        self.field = field
+        self.max_length = max_length or settings.TEXT_MAX_LENGTH
+        # a character is encoded in up to 6 characters, \uXXXX, plus the quotes
+        self.max_pending = 6 * self.max_length + 2
+        # characters of an incomplete value before it is decoded again
+        self.retry_length = 0
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.final = False
+        self.size = 0
+        self.state = "start"
+        self.key = ""
+        self.texts: List[Any] = []
+        self.result: Dict[str, Any] = {}
+
+    def feed(self, data: bytes, final: bool = False) -> None:
+        self.size += len(data)
+        self.buffer = self.buffer[self.pos :] + self.utf8.decode(data, final)
+        self.pos = 0
+        self.final = final
+        try:
+            self.parse()
+        except Incomplete:
+            if final:
+                raise self.error("Unexpected end of data") from None
+
+    def error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self.buffer, self.pos)
+
+    def is_incomplete(self, error: json.JSONDecodeError) -> bool:
+        # strings and escape sequences cut at the end of the buffer continue in the next chunk
+        return not self.final and (
+            error.msg.startswith("Unterminated string") or error.pos >= len(self.buffer) - 6
+        )
+
+    def check_pending(self, what: str) -> None:
+        if len(self.buffer) - self.pos > self.max_pending:
+            raise HTTPException(
+                status_code=413, detail=f"{what} is longer than {self.max_length} characters"
+            )
+
+    def char(self) -> str:
+        self.pos = WHITESPACE.match(self.buffer, self.pos).end()  # type: ignore
+        if self.pos == len(self.buffer):
+            raise Incomplete
+        return self.buffer[self.pos]
+
+    def expect(self, expected: str) -> None:
+        if self.char() != expected:
+            raise self.error(f"Expecting '{expected}'")
+        self.pos += 1
+
+    def value(self) -> Any:
+        pending = len(self.buffer) - self.pos
+        if not self.final and (
+            pending < self.retry_length
+            # numbers and literals are complete once followed by a delimiter
+            or (self.buffer[self.pos] not in '"[{' and not DELIMITER.search(self.buffer, self.pos))
+        ):
+            raise Incomplete
+        try:
+            value, end = self.decoder.raw_decode(self.buffer, self.pos)
+        except json.JSONDecodeError as error:
+            if self.is_incomplete(error):
+                if pending > settings.REQUEST_BODY_LIMIT:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Value of {self.key} is over {settings.REQUEST_BODY_LIMIT} "
+                        "characters",
+                    ) from None
+                # decoded again once twice as long, so long values take linear time overall, or
+                # once over the limit
+                self.retry_length = min(2 * pending, settings.REQUEST_BODY_LIMIT + 1)
+                raise Incomplete from None
+            raise
+        self.retry_length = 0
+        self.pos = end
+        return value
+
+    def text(self) -> Any:
+        what = f"{self.field}[{len(self.texts)}]"
+        pos = WHITESPACE.match(self.buffer, self.pos).end()  # type: ignore
+        if pos == len(self.buffer):
+            raise Incomplete
+        if self.buffer[pos] != '"':
+            # not a string, left to validation of the model
+            self.pos = pos
+            return self.value()
+        try:
+            text, end = scanstring(self.buffer, pos + 1)
+        except json.JSONDecodeError as error:
+            self.pos = pos
+            if self.is_incomplete(error):
+                self.check_pending(what)
+                raise Incomplete from None
+            raise
+        if len(text) > self.max_length:
+            raise HTTPException(
+                status_code=413, detail=f"{what} is longer than {self.max_length} characters"
+            )
+        self.pos = end
+        return text
+
+    def parse_texts(self) -> None:
+        buffer, texts, max_length = self.buffer, self.texts, self.max_length
+        while True:
+            if self.state == "text":
+                texts.append(self.text())
+                self.state = "separator"
+            # fast path for a comma and a complete string within the limit, anything else is
+            # handled by text()
+            match = NEXT_TEXT.match(buffer, self.pos)
+            while match:
+                try:
+                    text, end = scanstring(buffer, match.end())
+                except json.JSONDecodeError:
+                    break
+                if len(text) > max_length:
+                    break
+                texts.append(text)
+                self.pos = end
+                match = NEXT_TEXT.match(buffer, end)
+            match = SEPARATOR.match(buffer, self.pos)
+            if match is None:
+                # raises Incomplete if only whitespace is left
+                self.char()
+                raise self.error("Expecting ',' delimiter")
+            self.pos = match.end()
+            if match.group(1) == "]":
+                self.state = "next"
+                return
+            self.state = "text"
+
+    def parse(self) -> None:
+        while self.state != "end":
+            if self.state in ("text", "separator"):
+                self.parse_texts()
+                continue
+            char = self.char()
+            if self.state == "start":
+                self.expect("{")
+                self.state = "first_key"
+            elif self.state == "first_key" and char == "}":
+                self.pos += 1
+                self.state = "end"
+            elif self.state in ("first_key", "key"):
+                if char != '"':
+                    raise self.error("Expecting property name enclosed in double quotes")
+                self.key = self.value()
+                self.state = "colon"
+            elif self.state == "colon":
+                self.expect(":")
+                self.state = "value"
+            elif self.state == "value" and self.key == self.field and char == "[":
+                self.pos += 1
+                self.texts = self.result[self.key] = []
+                self.state = "first_text"
+            elif self.state == "value":
+                self.result[self.key] = self.value()
+                self.state = "next"
+            elif self.state == "first_text":
+                if char == "]":
+                    self.pos += 1
+                    self.state = "next"
+                else:
+                    self.state = "text"
+            elif self.state == "next":
+                if char not in ",}":
+                    raise self.error("Expecting ',' delimiter")
+                self.pos += 1
+                self.state = "key" if char == "," else "end"
+        if WHITESPACE.match(self.buffer, self.pos).end() != len(self.buffer):  # type: ignore
+            raise self.error("Extra data")
+
+
+def is_json(request: Request) -> bool:
+    # same check as FastAPI's to parse bodies as JSON
+    content_type = request.headers.get("content-type")
+    if not content_type:
+        return True
+    message = email.message.Message()
+    message["content-type"] = content_type
+    subtype = message.get_content_subtype()
+    return message.get_content_maintype() == "application" and (
+        subtype == "json" or subtype.endswith("+json")
+    )
+
+
+class StreamedRequest(Request):
+    """Request parsing its JSON body with StreamParser while it is received"""
+
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body") and is_json(self):
+            parser = StreamParser()
+            async for chunk in self.stream():
+                parser.feed(chunk)
+            if parser.size:
+                parser.feed(b"", final=True)
+                self._json = parser.result
+            # FastAPI only checks the body isn't empty before it calls json(), the raw body
+            # isn't kept
+            self._body = b"{}" if parser.size else b""
+        return await super().body()
+
+
+class StreamedRoute(APIRoute):
+    """Route of endpoints taking large lists of texts, their JSON bodies are streamed"""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def streamed_handler(request: Request) -> Response:
+            return await handler(StreamedRequest(request.scope, request.receive))
+
+        return streamed_handler
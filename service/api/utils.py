@@ -1,65 +1,366 @@
-from typing import Optional
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Collection,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
+import asyncio
+import copy
+import hashlib
 import io
+import json
+import re
 import uuid
+import weakref
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 
 import joblib
 from aiobotocore.session import ClientCreatorContext
-from bertopic import BERTopic
+from botocore.exceptions import ClientError
 from fastapi.exceptions import HTTPException
 from pydantic.types import UUID4
-from sklearn.datasets import fetch_20newsgroups
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from .. import crud
+from ..core import codecs, quantization, storage
 from ..core.config import settings
+from ..core.metrics import ARTIFACT_BYTES, timed
+from ..core.residency import residency
 from ..models import models
+from . import deps
+
+if TYPE_CHECKING:
+    from bertopic import BERTopic
 
 
 def get_sample_dataset():
+    from sklearn.datasets import fetch_20newsgroups
+
     dataset = fetch_20newsgroups(subset="all", remove=("headers", "footers", "quotes"))["data"]
     dataset = [doc for doc in dataset if len(doc) > 0]
     return dataset[:100]
 
 
-def get_model_filename(model_id: UUID4, version: int = 1) -> str:
-    return f"{model_id}_{version}"
+def deduplicate(texts: Sequence[str]) -> Tuple[List[str], List[int]]:
+    """Distinct texts in order of first occurrence and the index of every text among them"""
+    index: Dict[str, int] = {}
+    inverse = [index.setdefault(text, len(index)) for text in texts]
+    return list(index), inverse
+
+
+# training state not used by transform and visualizations, by BERTopic sub-model
+TRAINING_STATE = {
+    "umap_model": ("graph_", "graph_dists_", "_knn_indices", "_knn_dists", "_sigmas", "_rhos"),
+    # labels_ are kept, the condensed tree used for predictions is built with them
+    "hdbscan_model": (
+        "_raw_data",
+        "_single_linkage_tree",
+        "_min_spanning_tree",
+        "_outlier_scores",
+        "probabilities_",
+    ),
+    "vectorizer_model": ("stop_words_",),
+}
+
+
+# sub-models stored as separate chunks, unchanged ones are shared between versions
+COMPONENTS = ("embedding_model", "umap_model", "hdbscan_model", "vectorizer_model", "ctfidf_model")
+
+
+# embedding models of serving models by chunk digest, serving models with the same embedding
+# model share it while any of them is in memory, it is only read by predictions
+embedding_models: "weakref.WeakValueDictionary[str, Any]" = weakref.WeakValueDictionary()
+
+
+# keys of model variants as named by get_model_filename
+MODEL_FILENAME = re.compile(r"(?P<model_id>[0-9a-f-]{36})_(?P<version>\d+)(_serving)?")
+
+
+def get_model_filename(model_id: UUID4, version: int = 1, serving: bool = False) -> str:
+    return f"{model_id}_{version}_serving" if serving else f"{model_id}_{version}"
+
+
+def make_serving_model(topic_model: "BERTopic") -> "BERTopic":
+    """Copy of model without training-only state, enough for predictions and visualizations"""
+    serving_model = copy.copy(topic_model)
+    # empty topics still pass BERTopic's fitted checks
+    serving_model.topics_ = []
+    serving_model.probabilities_ = None
+    serving_model.representative_docs_ = {}
+    for name, attributes in TRAINING_STATE.items():
+        sub_model = copy.copy(getattr(topic_model, name))
+        for attribute in attributes:
+            if attribute in getattr(sub_model, "__dict__", {}):
+                setattr(sub_model, attribute, None)
+        setattr(serving_model, name, sub_model)
+    return serving_model
+
+
+def split_model(topic_model: "BERTopic") -> Dict[str, Any]:
+    """Split model into sub-models and the model itself without them"""
+    model = copy.copy(topic_model)
+    components = {}
+    for name in COMPONENTS:
+        components[name] = getattr(topic_model, name, None)
+        setattr(model, name, None)
+    components["model"] = model
+    return components
+
+
+def join_model(components: Dict[str, Any]) -> "BERTopic":
+    topic_model = components.pop("model")
+    for name, component in components.items():
+        setattr(topic_model, name, component)
+    return topic_model
+
+
+def serialize(obj: Any, restored_bytes: int = 0) -> Tuple[bytes, Dict[str, str]]:
+    with io.BytesIO() as f:
+        with timed("serialize_model"):
+            joblib.dump(obj, f)
+        data = f.getvalue()
+    # uncompressed size plus the growth of reduced precision arrays estimates memory needed to
+    # load the object
+    metadata = {"codec": settings.MODEL_CODEC, "size": str(len(data) + restored_bytes)}
+    with timed("compress_model"):
+        data = codecs.compress(data, settings.MODEL_CODEC, settings.MODEL_CODEC_LEVEL)
+    return data, metadata
+
+
+def deserialize(data: Union[bytes, bytearray], metadata: Dict[str, str]) -> Any:
+    # artifacts saved before codecs were introduced have no metadata
+    with timed("decompress_model"):
+        data = codecs.decompress(data, metadata.get("codec", "none"))
+    with timed("deserialize_model"), storage.BufferReader(data) as f:
+        return joblib.load(f)
+
+
+def get_chunk_filename(digest: str) -> str:
+    return f"{settings.CHUNK_PREFIX}{digest}"
 
 
 async def save_model(
     s3: ClientCreatorContext,
-    topic_model: BERTopic,
+    topic_model: "BERTopic",
     model_id: Optional[uuid.UUID] = None,
     version: int = 1,
-) -> uuid.UUID:
+) -> Tuple[uuid.UUID, List[str]]:
+    """
+    Save the full model and its serving variant without training-only state. Sub-models are
+    stored as content-addressed chunks shared between variants and versions, each variant is a
+    manifest of its chunks. Embeddings are stored in EMBEDDING_PRECISION. Returns model id and
+    chunks to reference from the model version.
+    """
     if model_id is None:
         model_id = uuid.uuid4()
-    model_name = get_model_filename(model_id, version)
+    variants = {
+        get_model_filename(model_id, version): topic_model,
+        get_model_filename(model_id, version, serving=True): make_serving_model(topic_model),
+    }
 
-    with io.BytesIO() as f:
-        joblib.dump(topic_model, f)
-        f.seek(0)
-        await s3.put_object(Bucket=settings.MINIO_BUCKET_NAME, Key=model_name, Body=f.read())
-    return model_id
+    chunks: Dict[str, Tuple[bytes, Dict[str, str]]] = {}
+    # both variants share most sub-models, serialize them once
+    digests: Dict[int, str] = {}
+    manifests = {}
+    for filename, variant in variants.items():
+        manifest = {}
+        for name, component in split_model(variant).items():
+            if id(component) not in digests:
+                data, metadata = serialize(
+                    *quantization.quantize(name, component, settings.EMBEDDING_PRECISION)
+                )
+                digests[id(component)] = hashlib.sha256(data).hexdigest()
+                chunks[digests[id(component)]] = (data, metadata)
+            manifest[name] = digests[id(component)]
+        manifests[filename] = manifest
+
+    # chunks are uploaded even if they exist, this refreshes them for GC of unreferenced chunks
+    with timed("upload_model"):
+        await asyncio.gather(
+            *(
+                storage.upload(s3, get_chunk_filename(digest), data, metadata)
+                for digest, (data, metadata) in chunks.items()
+            )
+        )
+        await asyncio.gather(
+            *(
+                storage.upload(
+                    s3,
+                    filename,
+                    json.dumps(manifest).encode(),
+                    {
+                        "manifest": "1",
+                        "size": str(sum(int(chunks[d][1]["size"]) for d in manifest.values())),
+                    },
+                )
+                for filename, manifest in manifests.items()
+            )
+        )
+    ARTIFACT_BYTES.labels(operation="save").observe(sum(len(data) for data, _ in chunks.values()))
+    return model_id, list(chunks)
 
 
-async def load_model(s3: ClientCreatorContext, model_id: uuid.UUID, version: int = 1) -> BERTopic:
-    try:
-        model_name = get_model_filename(model_id, version)
-        response = await s3.get_object(Bucket=settings.MINIO_BUCKET_NAME, Key=model_name)
+def get_model_filenames(model_id: uuid.UUID, version: int, serving: bool) -> List[str]:
+    """Artifacts to look for, models saved before serving variants existed only have the full one"""
+    filenames = [get_model_filename(model_id, version)]
+    if serving:
+        filenames.insert(0, get_model_filename(model_id, version, serving=True))
+    return filenames
 
-        with io.BytesIO() as f:  # double memory usage
-            async with response["Body"] as stream:
-                data = await stream.read()
-                f.write(data)
-                f.seek(0)
-            return joblib.load(f)
 
-    except s3.exceptions.NoSuchKey:
+async def load_model(
+    s3: ClientCreatorContext, model_id: uuid.UUID, version: int = 1, serving: bool = False
+) -> "BERTopic":
+    """
+    Load a private copy of model from storage, use `use_model` for read-only access.
+    `serving` loads the variant without training-only state.
+    """
+    for filename in get_model_filenames(model_id, version, serving):
+        try:
+            with timed("download_model"):
+                data, metadata = await storage.download(s3, filename)
+            break
+        except ClientError as e:
+            if not storage.is_not_found(e):
+                raise
+    else:
         raise HTTPException(status_code=404, detail="Model not found")
+    # models saved before chunked storage are a single pickle
+    if "manifest" not in metadata:
+        ARTIFACT_BYTES.labels(operation="load").observe(len(data))
+        return deserialize(data, metadata)
+
+    manifest: Dict[str, str] = json.loads(data)
+    components: Dict[str, Any] = {}
+    embedding_digest = manifest.get("embedding_model")
+    if serving and embedding_digest is not None:
+        embedding_model = embedding_models.get(embedding_digest)
+        if embedding_model is not None:
+            components["embedding_model"] = embedding_model
+    names = [name for name in manifest if name not in components]
+    with timed("download_model"):
+        chunks = await asyncio.gather(
+            *(storage.download(s3, get_chunk_filename(manifest[name])) for name in names)
+        )
+    ARTIFACT_BYTES.labels(operation="load").observe(sum(len(data) for data, _ in chunks))
+    for name, (data, metadata) in zip(names, chunks):
+        components[name] = deserialize(data, metadata)
+    if serving and embedding_digest is not None:
+        try:
+            embedding_models[embedding_digest] = components["embedding_model"]
+        except TypeError:
+            # None or objects not supporting weak references
+            pass
+    return join_model(components)
+
+
+async def get_model_size(
+    s3: ClientCreatorContext, model_id: uuid.UUID, version: int = 1, serving: bool = False
+) -> int:
+    """Uncompressed artifact size, a deserialized model takes about as much memory as its pickle"""
+    for filename in get_model_filenames(model_id, version, serving):
+        try:
+            response = await s3.head_object(Bucket=settings.MINIO_BUCKET_NAME, Key=filename)
+            return int(response.get("Metadata", {}).get("size", response["ContentLength"]))
+        except ClientError as e:
+            if not storage.is_not_found(e):
+                raise
+    raise HTTPException(status_code=404, detail="Model not found")
+
+
+async def delete_models(
+    s3: ClientCreatorContext,
+    versions: Collection[Tuple[uuid.UUID, int]],
+    chunks: Collection[str] = (),
+) -> None:
+    """
+    Delete both variants of model `versions` and `chunks` no longer referenced by other versions.
+    Callers hold `crud.model_chunk.lock` from checking references of `chunks` until this returns.
+    Objects failed to delete are left to `collect_garbage`.
+    """
+    keys = [get_chunk_filename(digest) for digest in chunks]
+    for model_id, version in versions:
+        keys += [
+            get_model_filename(model_id, version),
+            get_model_filename(model_id, version, True),
+        ]
+    await storage.delete(s3, keys)
+
+
+def parse_model_filename(key: str) -> Optional[Tuple[uuid.UUID, int]]:
+    """Model version stored under `key`, None for objects other than models"""
+    match = MODEL_FILENAME.fullmatch(key)
+    if match is None:
+        return None
+    return uuid.UUID(match["model_id"]), int(match["version"])
+
+
+async def collect_garbage(s3: ClientCreatorContext, session: AsyncSession) -> Tuple[int, int]:
+    """
+    Delete models without a database record and chunks no model references, objects modified
+    within ARTIFACT_GC_GRACE belong to saves in progress and are kept. Other objects, e.g.
+    profiles, are ignored. Returns number and total size of deleted objects.
+    """
+    expired = datetime.now(timezone.utc) - timedelta(seconds=settings.ARTIFACT_GC_GRACE)
+    deleted = size = 0
+    async for page in storage.list_objects(s3):
+        chunks: Dict[str, str] = {}
+        versions: Dict[str, Tuple[uuid.UUID, int]] = {}
+        for obj in page:
+            if obj["LastModified"] >= expired:
+                continue
+            if obj["Key"].startswith(settings.CHUNK_PREFIX):
+                chunks[obj["Key"]] = obj["Key"][len(settings.CHUNK_PREFIX) :]
+                continue
+            version = parse_model_filename(obj["Key"])
+            if version is not None:
+                versions[obj["Key"]] = version
+
+        # chunks listed as expired may have been refreshed by a save since
+        await crud.model_chunk.lock(session)
+        referenced = await crud.model_chunk.get_referenced(session, digests=chunks.values())
+        existing = await crud.topic_model.get_versions(
+            session, model_ids={model_id for model_id, _ in versions.values()}
+        )
+        orphans = {key for key, digest in chunks.items() if digest not in referenced}
+        orphans |= {key for key, version in versions.items() if version not in existing}
+        orphans -= set(await storage.delete(s3, list(orphans)))
+        await session.commit()
+        deleted += len(orphans)
+        size += sum(obj["Size"] for obj in page if obj["Key"] in orphans)
+    return deleted, size
+
+
+@asynccontextmanager
+async def use_model(model_id: uuid.UUID, version: int = 1) -> AsyncIterator["BERTopic"]:
+    """
+    Get serving model kept in memory between requests, loading it if needed. The model is shared
+    and must not be modified, it can be evicted from memory once the block exits.
+    """
+
+    # the load outlives the request starting it, so it doesn't use the client of the request
+    async def load() -> "BERTopic":
+        async with deps.create_s3_client() as s3:
+            return await load_model(s3, model_id, version, serving=True)
+
+    async def estimate() -> int:
+        async with deps.create_s3_client() as s3:
+            return await get_model_size(s3, model_id, version, serving=True)
+
+    async with residency.use((model_id, version), load=load, estimate=estimate) as topic_model:
+        yield topic_model
 
 
 async def save_topics(
-    topic_model: BERTopic, session: AsyncSession, model: models.TopicModel
+    topic_model: "BERTopic", session: AsyncSession, model: models.TopicModel
 ) -> None:
     topic_info = topic_model.get_topics()
     for topic_index, top_words in topic_info.items():
@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..core.metrics import STARTUP_SECONDS
+from ..core.residency import residency
+from .deps import create_s3_client
+from .utils import load_model
+
+
+def import_modeling_libraries() -> None:
+    import bertopic  # noqa: F401
+    import plotly.graph_objects  # noqa: F401
+
+
+async def load_preloaded_models() -> None:
+    async with create_s3_client() as s3:
+        for model_id, version in settings.PRELOAD_MODELS:
+            if (model_id, version) not in residency:
+                model = await load_model(s3, model_id, version, serving=True)
+                residency.add((model_id, version), model, permanent=True)
+
+
+def preload_models() -> None:
+    """Load PRELOAD_MODELS in the gunicorn master, forked workers share them copy-on-write"""
+    import_modeling_libraries()
+    asyncio.run(load_preloaded_models())
+
+
+async def warm_up() -> None:
+    """Import modeling libraries and load models from PRELOAD_MODELS before reporting readiness"""
+    start = time.perf_counter()
+    await run_in_threadpool(import_modeling_libraries)
+    STARTUP_SECONDS.labels(phase="import_modeling").set(time.perf_counter() - start)
+
+    if not settings.PRELOAD_MODELS:
+        return
+    start = time.perf_counter()
+    await load_preloaded_models()
+    STARTUP_SECONDS.labels(phase="preload_models").set(time.perf_counter() - start)
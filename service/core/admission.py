@@ -0,0 +1,90 @@
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, Optional
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi.exceptions import HTTPException
+
+from .config import settings
+from .metrics import ADMISSION_ACTIVE, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED
+
+
+class AdmissionController:
+    """
+    Limit concurrent requests of one endpoint class.
+
+    Up to `concurrency` requests run at once, up to `queue_size` more wait for a free slot,
+    the rest are rejected with 503 so clients retry later instead of the pod running out of memory.
+    Limits are per worker process.
+    """
+
+    def __init__(self, endpoint_class: str, concurrency: int, queue_size: int) -> None:
+        self.endpoint_class = endpoint_class
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.active = 0
+        self.waiting = 0
+        # created on first use to bind to the running event loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self.active >= self.concurrency and self.waiting >= self.queue_size:
+            ADMISSION_REJECTED.labels(endpoint_class=self.endpoint_class).inc()
+            raise HTTPException(
+                status_code=503,
+                detail=f"Too many {self.endpoint_class} requests, try again later",
+                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)},
+            )
+
+        queue_depth = ADMISSION_QUEUE_DEPTH.labels(endpoint_class=self.endpoint_class)
+        self.waiting += 1
+        queue_depth.inc()
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+            queue_depth.dec()
+
+        active = ADMISSION_ACTIVE.labels(endpoint_class=self.endpoint_class)
+        self.active += 1
+        active.inc()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            active.dec()
+            self.semaphore.release()
+
+
+controllers: Dict[str, AdmissionController] = {
+    "train": AdmissionController(
+        "train", settings.ADMISSION_TRAIN_CONCURRENCY, settings.ADMISSION_TRAIN_QUEUE
+    ),
+    "predict": AdmissionController(
+        "predict", settings.ADMISSION_PREDICT_CONCURRENCY, settings.ADMISSION_PREDICT_QUEUE
+    ),
+    "visualize": AdmissionController(
+        "visualize", settings.ADMISSION_VISUALIZE_CONCURRENCY, settings.ADMISSION_VISUALIZE_QUEUE
+    ),
+    "metadata": AdmissionController(
+        "metadata", settings.ADMISSION_METADATA_CONCURRENCY, settings.ADMISSION_METADATA_QUEUE
+    ),
+}
+
+
+def admit(endpoint_class: str) -> Callable[[], AsyncGenerator[None, None]]:
+    """Dependency holding a slot of `endpoint_class` for the duration of the request"""
+    controller = controllers[endpoint_class]
+
+    async def dependency() -> AsyncGenerator[None, None]:
+        async with controller.slot():
+            yield
+
+    return dependency
@@ -0,0 +1,84 @@
+from typing import List, Optional, Sequence, Tuple
+
+import asyncio
+import hashlib
+import socket
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from .config import settings
+
+
+def score(peer: str, model_id: uuid.UUID, version: int) -> int:
+    digest = hashlib.blake2b(f"{model_id}/{version}@{peer}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def owners(
+    model_id: uuid.UUID, version: int, peers: Sequence[str], replicas: int = 1
+) -> List[str]:
+    """
+    Peers serving a model version by rendezvous hashing, the `replicas` peers with the highest
+    score. Adding or removing a peer only moves the model versions it owns.
+    """
+    ranked = sorted(peers, key=lambda peer: score(peer, model_id, version), reverse=True)
+    return ranked[:replicas]
+
+
+class PeerSet:
+    """
+    Base URLs of the replicas sharing models. Peers are AFFINITY_PEERS, or the addresses of
+    AFFINITY_SERVICE, e.g. a headless Kubernetes service, resolved every AFFINITY_REFRESH seconds.
+    """
+
+    def __init__(
+        self, peers: Sequence[str], service: Optional[str] = None, refresh: float = 10
+    ) -> None:
+        self.peers = sorted(peers)
+        self.service = service
+        self.refresh = refresh
+        self.resolved_at: Optional[float] = None
+
+    async def resolve(self) -> List[str]:
+        assert self.service is not None
+        address = urlsplit(self.service)
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            address.hostname, address.port, type=socket.SOCK_STREAM
+        )
+        peers = set()
+        for *_, (host, *_) in infos:
+            # IPv6 addresses are bracketed in URLs
+            host = f"[{host}]" if ":" in host else host
+            peers.add(f"{address.scheme}://{host}:{address.port}")
+        return sorted(peers)
+
+    async def get(self) -> List[str]:
+        if self.service is None:
+            return self.peers
+        now = time.monotonic()
+        if self.resolved_at is None or now - self.resolved_at >= self.refresh:
+            self.resolved_at = now
+            try:
+                self.peers = await self.resolve()
+            except OSError:
+                # keep the last known peers until the service resolves again
+                pass
+        return self.peers
+
+
+peer_set = PeerSet(settings.AFFINITY_PEERS, settings.AFFINITY_SERVICE, settings.AFFINITY_REFRESH)
+
+
+def enabled() -> bool:
+    """Whether requests are routed, AFFINITY_SELF and peers or a peer service are set"""
+    return settings.AFFINITY_SELF is not None and bool(peer_set.peers or peer_set.service)
+
+
+async def route(model_id: uuid.UUID, version: int) -> Tuple[bool, List[str]]:
+    """Whether this replica owns the model version and the owners, empty without peers"""
+    peers = await peer_set.get()
+    if not peers or settings.AFFINITY_SELF is None:
+        return True, []
+    chosen = owners(model_id, version, peers, settings.AFFINITY_REPLICAS)
+    return settings.AFFINITY_SELF in chosen, chosen
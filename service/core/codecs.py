@@ -0,0 +1,37 @@
+from typing import Optional, Union
+
+# codecs of model artifacts, recorded in the "codec" object metadata
+CODECS = ("none", "lz4", "zstd")
+
+
+def compress(data: bytes, codec: str, level: Optional[int] = None) -> bytes:
+    """Compress `data` with `codec`, `level` defaults to the codec's default level"""
+    if codec == "lz4":
+        import lz4.frame
+
+        compressed: bytes = lz4.frame.compress(
+            data, compression_level=0 if level is None else level
+        )
+        return compressed
+    if codec == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+    if codec == "none":
+        return data
+    raise ValueError(f"Unknown codec {codec}")
+
+
+def decompress(data: Union[bytes, bytearray], codec: str) -> Union[bytes, bytearray]:
+    if codec == "lz4":
+        import lz4.frame
+
+        decompressed: bytes = lz4.frame.decompress(data)
+        return decompressed
+    if codec == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "none":
+        return data
+    raise ValueError(f"Unknown codec {codec}")
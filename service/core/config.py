@@ -1,4 +1,7 @@
+from typing import List, Literal, Optional, Tuple
+
 from pydantic import BaseSettings
+from pydantic.types import UUID4
 
 
 class Settings(BaseSettings):
@@ -18,6 +21,73 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
 
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    STRIP_PLOTLY_TEMPLATE: bool = False
+    # decompressed size limit of gzip and zstd request bodies
+    REQUEST_BODY_LIMIT: int = 2**30
+    # characters per text in requests, longer texts are rejected while the body is received
+    TEXT_MAX_LENGTH: int = 1_000_000
+
+    PROFILING_ENABLED: bool = False
+    PROFILING_HEADER: str = "X-Profile"
+    PROFILING_PREFIX: str = "profiles/"
+
+    # compression of saved models, one of "none", "lz4", "zstd", level defaults to the codec default
+    MODEL_CODEC: Literal["none", "lz4", "zstd"] = "zstd"
+    MODEL_CODEC_LEVEL: Optional[int] = None
+    # precision of document, UMAP and topic embeddings in saved models, "float16" or "int8" with a
+    # scale per row reduce artifacts at the cost of slightly different predictions
+    EMBEDDING_PRECISION: Literal["full", "float16", "int8"] = "full"
+
+    # content-addressed chunks of model artifacts, garbage collection deletes unreferenced chunks
+    # and manifests once not modified for ARTIFACT_GC_GRACE seconds, saves in progress refresh them
+    CHUNK_PREFIX: str = "chunks/"
+    ARTIFACT_GC_GRACE: int = 3600
+
+    # objects from this size are transferred in parts of S3_PART_SIZE, S3_CONCURRENCY at a time
+    S3_MULTIPART_THRESHOLD: int = 64 * 2**20
+    S3_PART_SIZE: int = 16 * 2**20
+    S3_CONCURRENCY: int = 8
+
+    # JSON list of [model_id, version] pairs loaded on startup and kept in memory
+    PRELOAD_MODELS: List[Tuple[UUID4, int]] = []
+    # per worker memory for deserialized models, idle models are evicted to stay within it
+    MODEL_MEMORY_BUDGET: int = 512 * 2**20
+    # per worker memory for cached predictions of documents by model version, 0 disables the cache
+    PREDICTION_CACHE_BYTES: int = 64 * 2**20
+    # gunicorn workers, preloaded models are shared between them
+    WORKERS: int = 1
+
+    # per worker threads for BLAS, OpenMP, numba and torch of a job, jobs of a worker run one at
+    # a time, by default available CPUs divided between workers
+    CPU_THREADS: Optional[int] = None
+
+    # per worker limits of concurrent and queued requests by endpoint class
+    ADMISSION_TRAIN_CONCURRENCY: int = 1
+    ADMISSION_TRAIN_QUEUE: int = 0
+    ADMISSION_PREDICT_CONCURRENCY: int = 4
+    ADMISSION_PREDICT_QUEUE: int = 16
+    ADMISSION_VISUALIZE_CONCURRENCY: int = 2
+    ADMISSION_VISUALIZE_QUEUE: int = 8
+    ADMISSION_METADATA_CONCURRENCY: int = 32
+    ADMISSION_METADATA_QUEUE: int = 128
+    ADMISSION_RETRY_AFTER: int = 5
+
+    # model affinity between replicas, each model version is served by AFFINITY_REPLICAS of the
+    # peers chosen by rendezvous hashing, requests reaching other replicas are forwarded to them.
+    # Peers are base URLs listed in AFFINITY_PEERS, or the addresses of AFFINITY_SERVICE, a URL
+    # like http://backend-peers:8000 resolved every AFFINITY_REFRESH seconds. AFFINITY_SELF is
+    # this replica among the peers, routing is disabled without it.
+    AFFINITY_PEERS: List[str] = []
+    AFFINITY_SERVICE: Optional[str] = None
+    AFFINITY_REFRESH: float = 10
+    AFFINITY_SELF: Optional[str] = None
+    AFFINITY_REPLICAS: int = 1
+    # seconds to connect to a peer, unreachable peers are skipped, and to wait for its response
+    AFFINITY_CONNECT_TIMEOUT: float = 1
+    AFFINITY_TIMEOUT: float = 600
+
     class Config:
         case_sensitive = False
 
@@ -0,0 +1,175 @@
+from typing import Iterator
+
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# label of the route handling the current request, e.g. "/modeling/{model_id}/predicting"
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="none")
+
+REQUEST_SECONDS = Histogram(
+    "bertopic_request_seconds",
+    "Request latency including response serialization",
+    ["endpoint", "method", "status"],
+)
+STAGE_SECONDS = Histogram(
+    "bertopic_stage_seconds",
+    "Latency of a single request processing stage",
+    ["endpoint", "stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+ARTIFACT_BYTES = Histogram(
+    "bertopic_model_artifact_bytes",
+    "Size of model artifacts transferred to/from storage",
+    ["operation"],
+    buckets=tuple(2**i for i in range(20, 34)),
+)
+STARTUP_SECONDS = Gauge(
+    "bertopic_startup_seconds",
+    "Time spent in startup phases",
+    ["phase"],
+    multiprocess_mode="max",
+)
+WORKER_MEMORY = Gauge(
+    "bertopic_worker_memory_bytes",
+    "Worker memory, shared pages include models preloaded before fork",
+    ["kind"],
+    multiprocess_mode="all",
+)
+IN_FLIGHT = Gauge(
+    "bertopic_requests_in_flight",
+    "Requests currently being processed",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+MODEL_CACHE = Counter(
+    "bertopic_model_cache",
+    "Lookups of deserialized models in worker memory",
+    ["result"],
+)
+PREDICTION_CACHE = Counter(
+    "bertopic_prediction_cache",
+    "Lookups of cached per document predictions",
+    ["result"],
+)
+RESIDENT_MODEL_BYTES = Gauge(
+    "bertopic_resident_model_bytes",
+    "Estimated memory of models kept in memory including loads in progress",
+    multiprocess_mode="livesum",
+)
+CPU_JOBS = Gauge(
+    "bertopic_cpu_jobs",
+    "CPU heavy jobs running within the worker thread budget",
+    multiprocess_mode="livesum",
+)
+ADMISSION_ACTIVE = Gauge(
+    "bertopic_admission_active",
+    "Requests holding an admission slot",
+    ["endpoint_class"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "bertopic_admission_queue_depth",
+    "Requests waiting for an admission slot",
+    ["endpoint_class"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_REJECTED = Counter(
+    "bertopic_admission_rejected",
+    "Requests rejected because the admission queue is full",
+    ["endpoint_class"],
+)
+AFFINITY_REQUESTS = Counter(
+    "bertopic_affinity_requests",
+    "Requests for a model version by replica serving it, unreachable owners are skipped",
+    ["result"],
+)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Observe execution time of the wrapped block as `stage` of the current endpoint"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(endpoint=current_endpoint.get(), stage=stage).observe(
+            time.perf_counter() - start
+        )
+
+
+def update_worker_memory() -> None:
+    """Report RSS, PSS and shared/private memory of the current process, Linux only"""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            lines = f.readlines()
+    except OSError:
+        return
+    # values are in kB, e.g. "Pss:  123456 kB"
+    fields = {line.split(":")[0]: int(line.split()[1]) * 1024 for line in lines[1:]}
+    WORKER_MEMORY.labels(kind="rss").set(fields["Rss"])
+    WORKER_MEMORY.labels(kind="pss").set(fields["Pss"])
+    WORKER_MEMORY.labels(kind="shared").set(fields["Shared_Clean"] + fields["Shared_Dirty"])
+    WORKER_MEMORY.labels(kind="private").set(fields["Private_Clean"] + fields["Private_Dirty"])
+
+
+async def report_worker_memory(interval: float = 15) -> None:
+    while True:
+        update_worker_memory()
+        await asyncio.sleep(interval)
+
+
+def route_path(scope: Scope) -> str:
+    """Path template of the matching route to keep label cardinality bounded"""
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return str(route.path)
+    return "unmatched"
+
+
+def render_metrics() -> bytes:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = route_path(scope)
+        token = current_endpoint.set(endpoint)
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        in_flight = IN_FLIGHT.labels(endpoint=endpoint)
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            REQUEST_SECONDS.labels(
+                endpoint=endpoint, method=scope["method"], status=str(status)
+            ).observe(time.perf_counter() - start)
+            current_endpoint.reset(token)
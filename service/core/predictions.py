@@ -0,0 +1,91 @@
+from typing import Hashable, List, Optional, Sequence, Tuple
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import numpy.typing as npt
+
+from .config import settings
+from .metrics import PREDICTION_CACHE
+
+# predicted topic and probabilities of all topics if they were requested
+Prediction = Tuple[int, Optional[npt.NDArray[np.float64]]]
+
+# approximate memory of an entry besides probabilities: key, digest, tuple and the array header
+ENTRY_OVERHEAD = 400
+
+
+def text_digest(text: str) -> bytes:
+    # lone surrogates are valid in JSON strings but can't be encoded by default
+    return hashlib.sha256(text.encode("utf-8", "surrogatepass")).digest()
+
+
+class PredictionCache:
+    """
+    LRU cache of per document predictions of model versions within `max_bytes`.
+
+    Model versions are immutable and `transform` predicts every document independently, so a
+    cached prediction is what the model would predict again.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.entries: "OrderedDict[Tuple[Hashable, bool, bytes], Prediction]" = OrderedDict()
+
+    @staticmethod
+    def size(prediction: Prediction) -> int:
+        _, probabilities = prediction
+        return ENTRY_OVERHEAD + (probabilities.nbytes if probabilities is not None else 0)
+
+    def get(
+        self, model: Hashable, texts: Sequence[str], calculate_probabilities: bool
+    ) -> List[Optional[Prediction]]:
+        """Cached predictions of `texts` by `model`, None for documents not in cache"""
+        predictions: List[Optional[Prediction]] = []
+        for text in texts:
+            key = (model, calculate_probabilities, text_digest(text))
+            prediction = self.entries.get(key)
+            if prediction is not None:
+                self.entries.move_to_end(key)
+            predictions.append(prediction)
+        hits = sum(prediction is not None for prediction in predictions)
+        PREDICTION_CACHE.labels(result="hit").inc(hits)
+        PREDICTION_CACHE.labels(result="miss").inc(len(predictions) - hits)
+        return predictions
+
+    def put(
+        self,
+        model: Hashable,
+        texts: Sequence[str],
+        calculate_probabilities: bool,
+        topics: Sequence[int],
+        probabilities: Optional[npt.NDArray[np.float64]] = None,
+    ) -> List[Prediction]:
+        """Cache predictions of `texts` by `model`, `probabilities` are given if calculated"""
+        predictions: List[Prediction] = []
+        for i, (text, topic) in enumerate(zip(texts, topics)):
+            # copy the row to not keep the whole probabilities matrix alive
+            prediction = (int(topic), None if probabilities is None else probabilities[i].copy())
+            predictions.append(prediction)
+            if self.size(prediction) > self.max_bytes:
+                continue
+            key = (model, calculate_probabilities, text_digest(text))
+            if key in self.entries:
+                self.used -= self.size(self.entries.pop(key))
+            self.entries[key] = prediction
+            self.used += self.size(prediction)
+        while self.used > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.used -= self.size(evicted)
+        return predictions
+
+    def discard(self, *models: Hashable) -> None:
+        """Forget predictions of removed models, their versions are never predicted again"""
+        removed = set(models)
+        for key in [key for key in self.entries if key[0] in removed]:
+            self.used -= self.size(self.entries.pop(key))
+
+
+prediction_cache = PredictionCache(settings.PREDICTION_CACHE_BYTES)
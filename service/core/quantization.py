@@ -0,0 +1,95 @@
+from typing import Any, Optional, Tuple, Union
+
+import copy
+
+import numpy as np
+import numpy.typing as npt
+
+# precisions of embeddings in model artifacts, "full" keeps arrays as they are
+PRECISIONS = ("full", "float16", "int8")
+
+# 2D float arrays of embeddings by sub-model as named by `split_model`, other arrays keep their
+# precision. Topic embeddings are only used through cosine similarity, which upcasts its input,
+# so float16 ones are kept as is, UMAP arrays go to numba code expecting their original dtype.
+EMBEDDINGS = {
+    "model": {"topic_embeddings_": False},
+    "umap_model": {"_raw_data": True, "embedding_": True},
+}
+
+
+def restore(
+    data: npt.NDArray[Union[np.int8, np.float16]],
+    scale: Optional[npt.NDArray[np.float32]],
+    dtype: Optional[str],
+) -> npt.NDArray[np.floating[Any]]:
+    """Array of a `Quantized` one in `dtype`, int8 ones default to float32, float16 ones stay"""
+    restored: npt.NDArray[np.floating[Any]]
+    if scale is not None:
+        restored = (data * scale).astype(dtype or np.float32, copy=False)
+    elif dtype is None:
+        restored = data.astype(np.float16, copy=False)
+    else:
+        restored = data.astype(dtype)
+    return restored
+
+
+class Quantized:
+    """
+    Array stored in float16, or in int8 with a scale per row, unpickled as an array by `restore`.
+    Only the artifact holds the reduced array, unless `upcast` is False and it's float16.
+    """
+
+    def __init__(
+        self, array: npt.NDArray[np.floating[Any]], precision: str, upcast: bool = True
+    ) -> None:
+        self.dtype = array.dtype.str if upcast else None
+        self.data: npt.NDArray[Union[np.int8, np.float16]]
+        self.scale: Optional[npt.NDArray[np.float32]] = None
+        if precision == "float16":
+            self.data = array.astype(np.float16)
+        else:
+            # symmetric scale by the largest absolute value of each row, zero rows stay zero
+            scale = np.abs(array).max(axis=1, keepdims=True).astype(np.float32) / 127
+            scale[scale == 0] = 1
+            self.data = np.round(array / scale).astype(np.int8)
+            self.scale = scale
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return restore, (self.data, self.scale, self.dtype)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    @property
+    def restored_nbytes(self) -> int:
+        if self.dtype is not None:
+            return self.data.size * np.dtype(self.dtype).itemsize
+        return self.data.size * (4 if self.scale is not None else 2)
+
+
+def quantize(name: str, component: Any, precision: str) -> Tuple[Any, int]:
+    """
+    Copy of sub-model `name` with its embeddings stored in `precision`, and the bytes its arrays
+    gain when they are restored, to estimate memory of the loaded model from the pickle size.
+    """
+    attributes = getattr(component, "__dict__", {})
+    quantized, restored_bytes = component, 0
+    for attribute, upcast in EMBEDDINGS.get(name, {}).items():
+        array = attributes.get(attribute)
+        if (
+            precision == "full"
+            or not isinstance(array, np.ndarray)
+            or array.ndim != 2
+            or array.dtype.kind != "f"
+            or array.dtype.itemsize <= np.dtype(np.float16).itemsize
+            # values out of the float16 range would become infinite
+            or (precision == "float16" and np.abs(array).max(initial=0) > np.finfo(np.float16).max)
+        ):
+            continue
+        value = Quantized(array, precision, upcast)
+        if quantized is component:
+            quantized = copy.copy(component)
+        setattr(quantized, attribute, value)
+        restored_bytes += value.restored_nbytes - value.nbytes
+    return quantized, restored_bytes
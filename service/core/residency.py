@@ -0,0 +1,239 @@
+import types
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+import asyncio
+import datetime
+import sys
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from functools import partial
+
+from .config import settings
+from .metrics import MODEL_CACHE, RESIDENT_MODEL_BYTES
+
+
+def deep_sizeof(obj: Any) -> int:
+    """
+    Estimate memory used by an object graph.
+
+    Array buffers (numpy, scipy sparse through its arrays, torch tensors) are counted by their data
+    size, everything else by `sys.getsizeof`. Shared objects and array bases are counted once.
+    """
+    # arrays can only exist if their library was imported, don't import it here
+    np = sys.modules.get("numpy")
+    torch = sys.modules.get("torch")
+    skipped = (
+        type,
+        types.ModuleType,
+        types.FunctionType,
+        types.BuiltinFunctionType,
+        types.MethodType,
+    )
+
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, skipped):
+            continue
+        seen.add(id(obj))
+
+        if np is not None and isinstance(obj, np.ndarray):
+            base = obj if obj.base is None else obj.base
+            if base is obj or id(base) not in seen:
+                seen.add(id(base))
+                size += getattr(base, "nbytes", obj.nbytes)
+            if obj.dtype == object:
+                stack.extend(obj.ravel())
+            continue
+        if torch is not None and isinstance(obj, torch.Tensor):
+            size += obj.element_size() * obj.nelement()
+            continue
+
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, (str, bytes, int, float, bool)):
+            continue
+        else:
+            if hasattr(obj, "__dict__"):
+                stack.append(obj.__dict__)
+            for slot in getattr(type(obj), "__slots__", ()):
+                if hasattr(obj, slot):
+                    stack.append(getattr(obj, slot))
+    return size
+
+
+@dataclass
+class Resident:
+    model: Any
+    size: int
+    permanent: bool = False
+    last_used: datetime.datetime = field(default_factory=datetime.datetime.utcnow)
+
+
+class ResidencyManager:
+    """
+    Keep deserialized models in memory within a memory budget.
+
+    Models are pinned while requests use them. To make room for a new model the least recently used
+    idle models are evicted, if models in use take the whole budget the load waits until they
+    are released. Permanent models (PRELOAD_MODELS) are never evicted, a model that doesn't fit
+    next to them is loaded when no other model is resident or being loaded.
+    """
+
+    def __init__(self, budget: int) -> None:
+        self.budget = budget
+        self.residents: "OrderedDict[Hashable, Resident]" = OrderedDict()
+        # memory reserved for loads in progress
+        self.reserved = 0
+        self.loading: Dict[Hashable, "asyncio.Task[Resident]"] = {}
+        # requests using or waiting for a model, pinned before it is loaded so it can't be evicted
+        self.pins: "Counter[Hashable]" = Counter()
+        self._changed: Optional[asyncio.Condition] = None
+
+    @property
+    def changed(self) -> asyncio.Condition:
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    @property
+    def used(self) -> int:
+        return sum(resident.size for resident in self.residents.values()) + self.reserved
+
+    @property
+    def transient(self) -> int:
+        """Memory of models that aren't permanent and of loads in progress"""
+        return (
+            sum(resident.size for resident in self.residents.values() if not resident.permanent)
+            + self.reserved
+        )
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.residents
+
+    def add(self, key: Hashable, model: Any, permanent: bool = False) -> Resident:
+        resident = Resident(model=model, size=deep_sizeof(model), permanent=permanent)
+        self.residents[key] = resident
+        RESIDENT_MODEL_BYTES.set(self.used)
+        return resident
+
+    def evict(self, required: int = 0) -> None:
+        """Evict idle models, least recently used first, until `required` bytes fit the budget"""
+        for key in list(self.residents):
+            if self.used + required <= self.budget:
+                break
+            if self.pins[key] == 0 and not self.residents[key].permanent:
+                del self.residents[key]
+        RESIDENT_MODEL_BYTES.set(self.used)
+
+    async def discard(self, *keys: Hashable) -> None:
+        """
+        Remove models of removed versions, including permanent ones. Requests using them keep
+        their reference until they finish, the memory is freed for other models right away.
+        """
+        async with self.changed:
+            for key in keys:
+                self.residents.pop(key, None)
+            RESIDENT_MODEL_BYTES.set(self.used)
+            self.changed.notify_all()
+
+    async def reserve(self, size: int) -> None:
+        async with self.changed:
+            while True:
+                self.evict(size)
+                # waiting can't free memory of permanent models
+                if self.used + size <= self.budget or self.transient == 0:
+                    break
+                await self.changed.wait()
+            self.reserved += size
+
+    async def release_reservation(self, size: int) -> None:
+        async with self.changed:
+            self.reserved -= size
+            self.changed.notify_all()
+
+    async def load(
+        self,
+        key: Hashable,
+        load: Callable[[], Awaitable[Any]],
+        estimate: Callable[[], Awaitable[int]],
+    ) -> Resident:
+        reservation = await estimate()
+        await self.reserve(reservation)
+        try:
+            model = await load()
+        finally:
+            await self.release_reservation(reservation)
+        return self.add(key, model)
+
+    def loaded(self, key: Hashable, task: "asyncio.Task[Resident]") -> None:
+        del self.loading[key]
+        # waiters get the error, mark it retrieved in case all of them were cancelled
+        if not task.cancelled():
+            task.exception()
+
+    @asynccontextmanager
+    async def use(
+        self,
+        key: Hashable,
+        load: Callable[[], Awaitable[Any]],
+        estimate: Callable[[], Awaitable[int]],
+    ) -> AsyncIterator[Any]:
+        """
+        Pin model `key` for the duration of the block, loading it with `load` if it isn't resident.
+        `estimate` returns the expected model size to reserve memory before loading.
+        Concurrent requests for a model being loaded wait for the same load and get its errors.
+        """
+        self.pins[key] += 1
+        try:
+            resident = self.residents.get(key)
+            if resident is not None:
+                MODEL_CACHE.labels(result="hit").inc()
+            else:
+                task = self.loading.get(key)
+                if task is None:
+                    MODEL_CACHE.labels(result="miss").inc()
+                    # a separate task, so the load isn't cancelled with the request that started it
+                    task = asyncio.ensure_future(self.load(key, load, estimate))
+                    self.loading[key] = task
+                    task.add_done_callback(partial(self.loaded, key))
+                else:
+                    MODEL_CACHE.labels(result="coalesced").inc()
+                loaded: Resident = await asyncio.shield(task)
+                resident = loaded
+
+            resident.last_used = datetime.datetime.utcnow()
+            # the version may have been removed while it was loading
+            if key in self.residents:
+                self.residents.move_to_end(key)
+            yield resident.model
+        finally:
+            self.pins[key] -= 1
+            if self.pins[key] == 0:
+                del self.pins[key]
+            async with self.changed:
+                if self.used > self.budget:
+                    self.evict()
+                self.changed.notify_all()
+
+    def info(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "key": key,
+                "size": resident.size,
+                "pins": self.pins[key],
+                "permanent": resident.permanent,
+                "last_used": resident.last_used,
+            }
+            for key, resident in self.residents.items()
+        ]
+
+
+residency = ResidencyManager(settings.MODEL_MEMORY_BUDGET)
@@ -0,0 +1,169 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+
+import asyncio
+import io
+
+from aiobotocore.session import ClientCreatorContext
+from botocore.exceptions import ClientError
+
+from .config import settings
+
+# read size when copying a part from the response stream into the buffer
+READ_SIZE = 2**20
+# maximum number of keys in a single DeleteObjects request
+DELETE_BATCH = 1000
+
+
+class BufferReader(io.RawIOBase):
+    """Read-only file over a buffer, unlike `io.BytesIO(bytearray)` it doesn't copy the buffer"""
+
+    def __init__(self, buffer: Union[bytes, bytearray]) -> None:
+        self.view = memoryview(buffer)
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b: Any) -> int:
+        size = min(len(b), len(self.view) - self.position)
+        b[:size] = self.view[self.position : self.position + size]
+        self.position += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        start = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: len(self.view)}[whence]
+        self.position = start + offset
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+
+def is_not_found(error: ClientError) -> bool:
+    # HEAD responses have no body, missing keys are reported by the status code only
+    return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey")
+
+
+async def download(
+    s3: ClientCreatorContext, key: str
+) -> Tuple[Union[bytes, bytearray], Dict[str, str]]:
+    """
+    Download object and its user metadata. Objects over S3_MULTIPART_THRESHOLD are fetched with
+    concurrent Range requests of S3_PART_SIZE written straight into a preallocated buffer.
+    """
+    head = await s3.head_object(Bucket=settings.MINIO_BUCKET_NAME, Key=key)
+    size = head["ContentLength"]
+    metadata = head.get("Metadata", {})
+    if size < settings.S3_MULTIPART_THRESHOLD:
+        response = await s3.get_object(Bucket=settings.MINIO_BUCKET_NAME, Key=key)
+        async with response["Body"] as stream:
+            return await stream.read(), metadata
+
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    semaphore = asyncio.Semaphore(settings.S3_CONCURRENCY)
+
+    async def download_part(start: int) -> None:
+        end = min(start + settings.S3_PART_SIZE, size)
+        async with semaphore:
+            response = await s3.get_object(
+                Bucket=settings.MINIO_BUCKET_NAME, Key=key, Range=f"bytes={start}-{end - 1}"
+            )
+            async with response["Body"] as stream:
+                while start < end:
+                    chunk = await stream.read(min(READ_SIZE, end - start))
+                    if not chunk:
+                        raise IOError(f"Incomplete download of {key}, part ended at {start}")
+                    view[start : start + len(chunk)] = chunk
+                    start += len(chunk)
+
+    await asyncio.gather(
+        *(download_part(start) for start in range(0, size, settings.S3_PART_SIZE))
+    )
+    return buffer, metadata
+
+
+async def upload(
+    s3: ClientCreatorContext, key: str, data: bytes, metadata: Optional[Dict[str, str]] = None
+) -> None:
+    """Upload object, objects over S3_MULTIPART_THRESHOLD are sent as concurrent multipart parts"""
+    metadata = metadata or {}
+    if len(data) < settings.S3_MULTIPART_THRESHOLD:
+        await s3.put_object(
+            Bucket=settings.MINIO_BUCKET_NAME, Key=key, Body=data, Metadata=metadata
+        )
+        return
+
+    response = await s3.create_multipart_upload(
+        Bucket=settings.MINIO_BUCKET_NAME, Key=key, Metadata=metadata
+    )
+    upload_id = response["UploadId"]
+    view = memoryview(data)
+    semaphore = asyncio.Semaphore(settings.S3_CONCURRENCY)
+
+    async def upload_part(number: int, start: int) -> Dict[str, Any]:
+        async with semaphore:
+            response = await s3.upload_part(
+                Bucket=settings.MINIO_BUCKET_NAME,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=number,
+                Body=bytes(view[start : start + settings.S3_PART_SIZE]),
+            )
+        return {"PartNumber": number, "ETag": response["ETag"]}
+
+    try:
+        parts: List[Dict[str, Any]] = await asyncio.gather(
+            *(
+                upload_part(number, start)
+                for number, start in enumerate(range(0, len(data), settings.S3_PART_SIZE), 1)
+            )
+        )
+        await s3.complete_multipart_upload(
+            Bucket=settings.MINIO_BUCKET_NAME,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+    except BaseException:
+        await s3.abort_multipart_upload(
+            Bucket=settings.MINIO_BUCKET_NAME, Key=key, UploadId=upload_id
+        )
+        raise
+
+
+async def list_objects(
+    s3: ClientCreatorContext, prefix: str = ""
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Iterate over pages of up to 1000 objects with `Key`, `Size` and `LastModified`"""
+    paginator = s3.get_paginator("list_objects_v2")
+    async for page in paginator.paginate(Bucket=settings.MINIO_BUCKET_NAME, Prefix=prefix):
+        yield page.get("Contents", [])
+
+
+async def delete(s3: ClientCreatorContext, keys: Sequence[str]) -> List[str]:
+    """
+    Delete objects with DeleteObjects requests of up to DELETE_BATCH keys, S3_CONCURRENCY at a
+    time. Missing keys count as deleted, returns keys that failed to delete.
+    """
+    semaphore = asyncio.Semaphore(settings.S3_CONCURRENCY)
+
+    async def delete_batch(batch: Sequence[str]) -> List[str]:
+        async with semaphore:
+            response = await s3.delete_objects(
+                Bucket=settings.MINIO_BUCKET_NAME,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+        # quiet mode only reports errors
+        return [error["Key"] for error in response.get("Errors", [])]
+
+    failed = await asyncio.gather(
+        *(
+            delete_batch(keys[start : start + DELETE_BATCH])
+            for start in range(0, len(keys), DELETE_BATCH)
+        )
+    )
+    return [key for batch in failed for key in batch]
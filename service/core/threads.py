@@ -0,0 +1,86 @@
+from typing import Iterator, Optional
+
+import math
+import os
+import sys
+from contextlib import contextmanager
+
+from .config import settings
+from .metrics import CPU_JOBS
+
+
+def available_cpus() -> int:
+    """CPUs the process may use, respecting affinity and the cgroup v2 quota (k8s CPU limit)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def clamp_jobs(n_jobs: Optional[int], limit: int) -> int:
+    """Clamp joblib style `n_jobs` (negative values count from the number of CPUs) to `limit`"""
+    if n_jobs is None or n_jobs < 0 or n_jobs > limit:
+        return limit
+    return max(1, n_jobs)
+
+
+class ThreadBudget:
+    """
+    Per worker cap on CPU threads of jobs.
+
+    Every CPU heavy stage runs as a job, BLAS, OpenMP, numba and torch thread pools are limited
+    to `threads` for its duration. Jobs run synchronously on the event loop, so a worker runs one
+    at a time with the whole cap, and workers split the CPUs by their caps. The limits are
+    process-wide, jobs must not run in concurrent threads of a worker.
+    """
+
+    def __init__(self, threads: int) -> None:
+        self.threads = threads
+
+    @contextmanager
+    def job(self) -> Iterator[int]:
+        CPU_JOBS.inc()
+        try:
+            with limit_threads(self.threads):
+                yield self.threads
+        finally:
+            CPU_JOBS.dec()
+
+
+@contextmanager
+def limit_threads(n_threads: int) -> Iterator[None]:
+    from threadpoolctl import threadpool_limits
+
+    # libraries not imported yet can't have started thread pools
+    numba = sys.modules.get("numba")
+    # querying numba threads launches its threading layer, launched from a non-main thread it can
+    # hang the interpreter on exit, it's launched by the first parallel function anyway
+    parallel = sys.modules.get("numba.np.ufunc.parallel")
+    if parallel is None or not getattr(parallel, "_is_initialized", False):
+        numba = None
+    torch = sys.modules.get("torch")
+    with threadpool_limits(limits=n_threads):
+        numba_threads = numba.get_num_threads() if numba is not None else None
+        torch_threads = torch.get_num_threads() if torch is not None else None
+        if numba is not None:
+            numba.set_num_threads(min(n_threads, numba.config.NUMBA_NUM_THREADS))
+        if torch is not None:
+            torch.set_num_threads(n_threads)
+        try:
+            yield
+        finally:
+            if numba is not None:
+                numba.set_num_threads(numba_threads)
+            if torch is not None:
+                torch.set_num_threads(torch_threads)
+
+
+thread_budget = ThreadBudget(settings.CPU_THREADS or max(1, available_cpus() // settings.WORKERS))
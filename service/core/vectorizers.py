@@ -0,0 +1,166 @@
+from typing import Any, Counter, Dict, Iterable, Iterator, List, Optional
+
+import collections
+
+import numpy as np
+import numpy.typing as npt
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.utils.validation import check_is_fitted
+
+# distinct tokens of documents hashed per FeatureHasher call, their counts are kept meanwhile
+HASH_BATCH = 2**16
+
+
+class HashedCountVectorizer(CountVectorizer):
+    """
+    Count vectorizer hashing tokens into `n_features` buckets instead of building a vocabulary,
+    so memory is bounded by the number of buckets. Colliding tokens share a column named after
+    the most frequent of them. Buckets without tokens in the fitted documents are dropped, like
+    words outside of the vocabulary. `vocabulary`, `min_df`, `max_df` and `max_features` are
+    not used.
+    """
+
+    def __init__(self, *, n_features: int = 2**20, **params: Any) -> None:
+        super().__init__(**params)
+        self.n_features = n_features
+
+    @classmethod
+    def _get_param_names(cls) -> List[str]:
+        # parameters passed through to CountVectorizer aren't in the signature
+        return sorted(CountVectorizer._get_param_names() + ["n_features"])
+
+    @staticmethod
+    def _batches(analyzed: Iterable[List[str]]) -> Iterator[List[Counter[str]]]:
+        """Token counts of documents grouped by HASH_BATCH distinct tokens"""
+        batch: List[Counter[str]] = []
+        size = 0
+        for tokens in analyzed:
+            batch.append(collections.Counter(tokens))
+            size += len(batch[-1])
+            if size >= HASH_BATCH:
+                yield batch
+                batch, size = [], 0
+        if batch:
+            yield batch
+
+    def _hash(
+        self, raw_documents: Iterable[str], names: Optional[Dict[int, str]] = None
+    ) -> csr_matrix:
+        """Token counts by bucket, `names` are updated with the most frequent token of buckets"""
+        analyze = self.build_analyzer()
+        hasher = FeatureHasher(self.n_features, input_type="string", alternate_sign=False)
+        # highest count of the token naming a bucket in a single document
+        best = np.zeros(self.n_features, dtype=np.int32) if names is not None else None
+        indptr, indices, data = [0], [], []
+        for counts in self._batches(analyze(doc) for doc in raw_documents):
+            for doc_counts in counts:
+                indptr.append(indptr[-1] + len(doc_counts))
+            tokens = [token for doc_counts in counts for token in doc_counts]
+            if not tokens:
+                continue
+            buckets = hasher.transform([token] for token in tokens).indices
+            values = np.fromiter(
+                (value for doc_counts in counts for value in doc_counts.values()),
+                dtype=np.int32,
+                count=len(tokens),
+            )
+            indices.append(buckets)
+            data.append(values)
+            if names is not None and best is not None:
+                # colliding tokens are assigned in order, the most frequent last
+                order = np.argsort(values, kind="stable")
+                for i in order[values[order] > best[buckets[order]]]:
+                    names[buckets[i]] = tokens[i]
+                np.maximum.at(best, buckets, values)
+
+        X = csr_matrix(
+            (
+                np.concatenate(data) if data else np.empty(0, dtype=np.int32),
+                np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+                indptr,
+            ),
+            shape=(len(indptr) - 1, self.n_features),
+            dtype=self.dtype,
+        )
+        X.sum_duplicates()
+        if self.binary:
+            X.data.fill(1)
+        return X
+
+    def fit(self, raw_documents: Iterable[str], y: Any = None) -> "HashedCountVectorizer":
+        self.fit_transform(raw_documents)
+        return self
+
+    def fit_transform(self, raw_documents: Iterable[str], y: Any = None) -> csr_matrix:
+        if isinstance(raw_documents, str):
+            raise ValueError("Iterable over raw text documents expected, string object received.")
+        names: Dict[int, str] = {}
+        X = self._hash(raw_documents, names)
+        self.columns_ = np.array(sorted(names), dtype=np.int64)
+        self.feature_names_ = np.array([names[bucket] for bucket in self.columns_], dtype=object)
+        return X[:, self.columns_]
+
+    def transform(self, raw_documents: Iterable[str]) -> csr_matrix:
+        if isinstance(raw_documents, str):
+            raise ValueError("Iterable over raw text documents expected, string object received.")
+        check_is_fitted(self, "columns_")
+        return self._hash(raw_documents)[:, self.columns_]
+
+    def get_feature_names_out(self, input_features: Any = None) -> npt.NDArray[np.object_]:
+        check_is_fitted(self, "feature_names_")
+        return self.feature_names_
+
+
+class PrunedCountVectorizer(CountVectorizer):
+    """
+    Count vectorizer building its vocabulary while streaming documents. Once more than twice
+    `max_vocabulary` tokens are counted, tokens counted fewer than `prune_min_count` times are
+    dropped, unless no token is counted that many times, then the least frequent ones down to
+    `max_vocabulary`. Counts of dropped tokens are lost, so the vocabulary, the `max_vocabulary`
+    most frequent tokens left at the end, approximates the most frequent tokens. Vocabularies
+    within `max_vocabulary` are the same as without pruning. `vocabulary`, `min_df`, `max_df` and
+    `max_features` are not used.
+    """
+
+    def __init__(
+        self, *, max_vocabulary: int = 100_000, prune_min_count: int = 2, **params: Any
+    ) -> None:
+        super().__init__(**params)
+        self.max_vocabulary = max_vocabulary
+        self.prune_min_count = prune_min_count
+
+    @classmethod
+    def _get_param_names(cls) -> List[str]:
+        # parameters passed through to CountVectorizer aren't in the signature
+        return sorted(CountVectorizer._get_param_names() + ["max_vocabulary", "prune_min_count"])
+
+    def _prune(self, counts: Counter[str]) -> Counter[str]:
+        most_common = counts.most_common(self.max_vocabulary)
+        frequent = [
+            (token, count) for token, count in most_common if count >= self.prune_min_count
+        ]
+        return collections.Counter(dict(frequent or most_common))
+
+    def fit(self, raw_documents: Iterable[str], y: Any = None) -> "PrunedCountVectorizer":
+        if isinstance(raw_documents, str):
+            raise ValueError("Iterable over raw text documents expected, string object received.")
+        analyze = self.build_analyzer()
+        counts: Counter[str] = collections.Counter()
+        for doc in raw_documents:
+            counts.update(analyze(doc))
+            # pruning at twice the limit keeps its cost amortized over documents
+            if len(counts) > 2 * self.max_vocabulary:
+                counts = self._prune(counts)
+        # rare tokens are kept if there is room left
+        if len(counts) > self.max_vocabulary:
+            counts = collections.Counter(dict(counts.most_common(self.max_vocabulary)))
+        self.vocabulary_ = {token: index for index, token in enumerate(sorted(counts))}
+        self.fixed_vocabulary_ = False
+        return self
+
+    def fit_transform(self, raw_documents: Iterable[str], y: Any = None) -> csr_matrix:
+        # documents may be a generator, they are analyzed again by transform
+        raw_documents = list(raw_documents)
+        return self.fit(raw_documents).transform(raw_documents)
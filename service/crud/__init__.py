@@ -1,4 +1,5 @@
+from .model_chunk import model_chunk
 from .topic import topic
 from .topic_model import topic_model
 
-__all__ = ["topic", "topic_model"]
+__all__ = ["model_chunk", "topic", "topic_model"]
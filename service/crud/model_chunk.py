@@ -0,0 +1,62 @@
+from typing import Collection, List, Set
+
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlmodel import SQLModel, col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from service.crud.base import CRUDBase
+from service.models.models import ModelChunk, TopicModel
+
+# key of the advisory lock guarding chunks, arbitrary but the same in every worker
+CHUNK_LOCK = 0x6368756E6B73
+
+
+class CRUDModelChunk(CRUDBase[ModelChunk, SQLModel, SQLModel]):
+    async def create_many(
+        self,
+        db: AsyncSession,
+        *,
+        topic_model_id: int,
+        digests: Collection[str],
+        commit: bool = True,
+    ) -> None:
+        """Reference chunks `digests` from the model version"""
+        db.add_all(
+            [self.model(topic_model_id=topic_model_id, digest=digest) for digest in digests]
+        )
+        if commit:
+            await db.commit()
+        else:
+            await db.flush()
+
+    async def lock(self, db: AsyncSession, *, shared: bool = False) -> None:
+        """
+        Lock chunks until the transaction ends. Saves hold the lock shared from uploading chunks
+        until referencing them, deletions hold it exclusively from checking references until
+        deleting chunks, so a referenced chunk is never deleted. Only Postgres has advisory locks,
+        other databases, e.g. SQLite in tests, aren't locked.
+        """
+        if (await db.connection()).dialect.name != "postgresql":
+            return
+        function = "pg_advisory_xact_lock_shared" if shared else "pg_advisory_xact_lock"
+        await db.execute(text(f"SELECT {function}(:key)").bindparams(key=CHUNK_LOCK))
+
+    async def get_digests(self, db: AsyncSession, *, model_id: UUID, version: int) -> List[str]:
+        statement = (
+            select(self.model.digest)
+            .join(TopicModel)
+            .filter(TopicModel.model_id == model_id, TopicModel.version == version)
+        )
+        return list((await db.execute(statement)).scalars().all())
+
+    async def get_referenced(self, db: AsyncSession, *, digests: Collection[str]) -> Set[str]:
+        """Chunks from `digests` still referenced by some model version"""
+        statement = (
+            select(self.model.digest).filter(col(self.model.digest).in_(digests)).distinct()
+        )
+        return set((await db.execute(statement)).scalars().all())
+
+
+model_chunk = CRUDModelChunk(ModelChunk)
@@ -6,6 +6,7 @@ from sqlalchemy.orm import selectinload
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from service.core.metrics import timed
 from service.crud.base import CRUDBase, ModelType
 from service.models.models import Topic, TopicBase, TopicCreate, TopicModel, Word
 
@@ -25,7 +26,12 @@ class CRUDTopic(CRUDBase[Topic, TopicCreate, TopicBase]):
         return (await db.execute(statement)).scalars().all()
 
     async def save_topics(
-        self, db: AsyncSession, *, topics: List[Dict[str, Any]], model: TopicModel
+        self,
+        db: AsyncSession,
+        *,
+        topics: List[Dict[str, Any]],
+        model: TopicModel,
+        commit: bool = True,
     ) -> None:
         for topic in topics:
             db_obj = self.model.from_orm(
@@ -35,7 +41,11 @@ class CRUDTopic(CRUDBase[Topic, TopicCreate, TopicBase]):
             for word in topic["top_words"]:
                 db.add(Word.parse_obj({**word, "topic": db_obj}))
 
-        await db.commit()
+        with timed("save_topics"):
+            if commit:
+                await db.commit()
+            else:
+                await db.flush()
 
 
 topic = CRUDTopic(Topic)
@@ -1,19 +1,42 @@
-from typing import Optional, Union
+from typing import Collection, List, Optional, Set, Tuple, Union
 
+import datetime
 from uuid import UUID
 
 from fastapi_pagination.bases import AbstractPage, AbstractParams
-from sqlalchemy import func
+from sqlalchemy import delete, func
 from sqlalchemy.exc import NoResultFound
-from sqlmodel import desc, select
+from sqlmodel import col, desc, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.sql.expression import Select, SelectOfScalar
 
 from service.crud.base import CRUDBase, ModelType
-from service.models.models import TopicModel, TopicModelBase
+from service.models.models import ModelChunk, ModelVersion, Topic, TopicModel, TopicModelBase, Word
 
 
 class CRUDTopicModel(CRUDBase[TopicModel, TopicModelBase, TopicModelBase]):
+    async def create(
+        self, db: AsyncSession, *, obj_in: TopicModelBase, commit: bool = True
+    ) -> TopicModel:
+        """
+        Create model version, without `commit` it is only flushed to claim the version. The version
+        is recorded as the last one of the model, it isn't reused after the version is removed.
+        """
+        db_obj = self.model.from_orm(obj_in)
+        db.add(db_obj)
+        counter = await db.get(ModelVersion, obj_in.model_id)
+        if counter is None:
+            counter = ModelVersion(model_id=obj_in.model_id, last_version=obj_in.version)
+        else:
+            counter.last_version = max(counter.last_version, obj_in.version)
+        db.add(counter)
+        if not commit:
+            await db.flush()
+            return db_obj
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
     async def get_by_id_version(
         self, db: AsyncSession, *, model_id: UUID, version: int
     ) -> ModelType:
@@ -33,14 +56,65 @@ class CRUDTopicModel(CRUDBase[TopicModel, TopicModelBase, TopicModelBase]):
         await db.commit()
         return model
 
+    async def remove_many(
+        self,
+        db: AsyncSession,
+        *,
+        model_id: Optional[UUID] = None,
+        created_before: Optional[datetime.datetime] = None,
+    ) -> Tuple[List[Tuple[UUID, int]], List[str]]:
+        """
+        Remove model versions matching all given filters with their topics and chunk references
+        using a bulk delete per table. Returns removed versions and chunks they referenced.
+        """
+        statement = select(self.model.id, self.model.model_id, self.model.version)
+        if model_id is not None:
+            statement = statement.filter(self.model.model_id == model_id)
+        if created_before is not None:
+            statement = statement.filter(self.model.created_at < created_before)
+        rows = (await db.execute(statement)).all()
+        ids = [row.id for row in rows]
+        chunks = (
+            (
+                await db.execute(
+                    select(ModelChunk.digest).filter(col(ModelChunk.topic_model_id).in_(ids))
+                )
+            )
+            .scalars()
+            .all()
+        )
+        topic_ids = select(Topic.id).filter(col(Topic.topic_model_id).in_(ids))
+        for deletion in (
+            delete(Word).where(col(Word.topic_id).in_(topic_ids)),
+            delete(Topic).where(col(Topic.topic_model_id).in_(ids)),
+            delete(ModelChunk).where(col(ModelChunk.topic_model_id).in_(ids)),
+            delete(self.model).where(col(self.model.id).in_(ids)),
+        ):
+            # removed rows loaded in the session are not used afterwards
+            await db.execute(deletion.execution_options(synchronize_session=False))
+        await db.commit()
+        return [(row.model_id, row.version) for row in rows], list(chunks)
+
+    async def get_versions(
+        self, db: AsyncSession, *, model_ids: Collection[UUID]
+    ) -> Set[Tuple[UUID, int]]:
+        """Existing versions of `model_ids`"""
+        statement = select(self.model.model_id, self.model.version).filter(
+            col(self.model.model_id).in_(model_ids)
+        )
+        return {(row.model_id, row.version) for row in (await db.execute(statement)).all()}
+
     async def get_max_version(self, db: AsyncSession, *, model_id: UUID) -> int:
-        return (
+        """Last version created of the model, including removed versions"""
+        counter = await db.get(ModelVersion, model_id)
+        existing = (
             await db.execute(
                 select(self.model)
                 .filter(self.model.model_id == model_id)
                 .with_only_columns(func.max(self.model.version))
             )
         ).scalar() or 0
+        return max(existing, counter.last_version if counter is not None else 0)
 
     async def paginate(
         self,
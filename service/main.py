@@ -1,8 +1,43 @@
+import asyncio
+import time
+
+from brotli_asgi import BrotliMiddleware
 from fastapi import FastAPI
 from fastapi_pagination import add_pagination
 
+from . import IMPORT_STARTED
+from .api.affinity import Forwarded, close_client, forwarded_response
 from .api.api import api_router
+from .api.decompression import DecompressionMiddleware
+from .api.profiling import ProfilingMiddleware
+from .api.warmup import warm_up
+from .core.config import settings
+from .core.metrics import STARTUP_SECONDS, MetricsMiddleware, report_worker_memory
 
 app = FastAPI()
 app.include_router(api_router)
+app.add_middleware(
+    BrotliMiddleware,
+    quality=settings.COMPRESSION_BROTLI_QUALITY,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    gzip_fallback=True,
+)
+app.add_middleware(DecompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
 add_pagination(app)
+app.add_exception_handler(Forwarded, forwarded_response)
+
+
+@app.on_event("startup")
+async def startup() -> None:
+    STARTUP_SECONDS.labels(phase="import").set(time.perf_counter() - IMPORT_STARTED)
+    # readiness probe waits for this task
+    app.state.warmup = asyncio.create_task(warm_up())
+    app.state.memory_reporter = asyncio.create_task(report_worker_memory())
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    await close_client()
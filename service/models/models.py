@@ -43,6 +43,29 @@ class TopicModel(TopicModelBase, table=True):
     topics: List["Topic"] = Relationship(
         back_populates="topic_model", sa_relationship_kwargs={"cascade": "all,delete"}
     )
+    chunks: List["ModelChunk"] = Relationship(
+        back_populates="topic_model", sa_relationship_kwargs={"cascade": "all,delete"}
+    )
+
+
+class ModelVersion(SQLModel, table=True):
+    """Last version created of a model, kept when versions are removed so none is reused"""
+
+    __tablename__ = "model_version"
+
+    model_id: UUID = Field(primary_key=True)
+    last_version: int = Field()
+
+
+class ModelChunk(SQLModel, table=True):
+    """Reference from a model version to an artifact chunk, chunks without references are deleted"""
+
+    __tablename__ = "model_chunk"
+
+    id: Optional[int] = Field(primary_key=True, nullable=False)  # NOQA: A003
+    topic_model_id: int = Field(foreign_key="topic_model.id")
+    digest: str = Field(index=True)
+    topic_model: TopicModel = Relationship(back_populates="chunks")
 
 
 class WordBase(SQLModel):
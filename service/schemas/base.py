@@ -1,5 +1,7 @@
 from typing import Any, Dict, List, Optional, Union
 
+import datetime
+
 from pydantic import BaseModel, Field, validator
 from pydantic.types import UUID4
 
@@ -40,11 +42,22 @@ class PredictIn(BaseModel):
     calculate_probabilities: bool = False
 
 
+class MultiPredictIn(BaseModel):
+    models: List[ModelId] = Field(min_items=1)
+    texts: List[str] = Field(min_length=1)
+    calculate_probabilities: bool = False
+
+
 class ModelPrediction(BaseModel):
     topics: List[int]
     probabilities: Optional[List[List[float]]]
 
 
+class PredictResult(BaseModel):
+    model: ModelId
+    predictions: ModelPrediction
+
+
 class FitResult(BaseModel):
     model: ModelId
     predictions: ModelPrediction
@@ -56,10 +69,47 @@ class DocsWithPredictions(ModelPrediction):
     num_topics: int
 
 
+class UpdateTopicsIn(BaseModel):
+    model: ModelId
+    texts: List[str] = []
+    # topics of `texts`, by default the topics the model assigned to its training documents
+    topics: Optional[List[int]] = None
+    top_n_words: int = Field(10, gt=0, le=30)
+    vectorizer_params: Optional[VectorizerParams] = None
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "model": {"model_id": "3fa85f64-5717-4562-b3fc-2c963f66afa6", "version": 1},
+                "texts": ["first training document", "second training document"],
+                "top_n_words": 5,
+                "vectorizer_params": {"stop_words": "english", "ngram_range": (1, 2)},
+            }
+        }
+
+
 class Message(BaseModel):
     message: str
 
 
+class ResidentModel(ModelId):
+    size: int
+    pins: int
+    permanent: bool
+    last_used: datetime.datetime
+
+
+class Residency(BaseModel):
+    budget: int
+    used: int
+    models: List[ResidentModel]
+
+
+class GarbageCollection(BaseModel):
+    objects: int
+    size: int
+
+
 class BaseVisualization(BaseModel):
     model: ModelId
     topics: Optional[List[int]] = None
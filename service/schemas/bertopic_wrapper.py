@@ -1,11 +1,9 @@
 from typing import Any, Dict, Iterable, List, Optional, Union
 
-from bertopic import BERTopic
-from hdbscan import HDBSCAN
-from pydantic import BaseModel
+from pydantic import BaseModel, root_validator
 from pydantic.fields import Field
-from sklearn.feature_extraction.text import CountVectorizer
-from umap import UMAP
+
+from ..core.threads import clamp_jobs, thread_budget
 
 
 class VectorizerParams(BaseModel):
@@ -22,6 +20,24 @@ class VectorizerParams(BaseModel):
     max_features: Optional[int] = None
     vocabulary: Optional[Iterable[str]] = None
     binary: Optional[bool] = False
+    # hash tokens into this many buckets instead of building a vocabulary, bounds memory of large
+    # vocabularies, colliding tokens share a topic word
+    n_features: Optional[int] = Field(None, gt=0)
+    # prune the least frequent tokens while counting to keep at most this many
+    max_vocabulary: Optional[int] = Field(None, gt=0)
+    # tokens counted fewer times are pruned first
+    prune_min_count: int = Field(2, ge=1)
+
+    @root_validator(skip_on_failure=True)
+    def check_vocabulary_mode(cls, values: Dict[str, Any]) -> Dict[str, Any]:
+        if values.get("n_features") and values.get("max_vocabulary"):
+            raise ValueError("n_features and max_vocabulary can't be used together")
+        if values.get("n_features") or values.get("max_vocabulary"):
+            # the bounded modes don't build a full vocabulary to filter
+            for name in ("min_df", "max_df", "max_features", "vocabulary"):
+                if values.get(name) != cls.__fields__[name].default:
+                    raise ValueError(f"{name} can't be used with n_features or max_vocabulary")
+        return values
 
 
 class UMAPParams(BaseModel):
@@ -77,6 +93,25 @@ class HDBSCANParams(BaseModel):
     match_reference_implementation: Optional[bool] = False
 
 
+def build_vectorizer(vectorizer_params: VectorizerParams) -> Any:
+    """CountVectorizer, or a bounded memory variant if hashing or pruning is requested"""
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    from ..core.vectorizers import HashedCountVectorizer, PrunedCountVectorizer
+
+    params = vectorizer_params.dict()
+    n_features = params.pop("n_features")
+    max_vocabulary = params.pop("max_vocabulary")
+    prune_min_count = params.pop("prune_min_count")
+    if n_features:
+        return HashedCountVectorizer(n_features=n_features, **params)
+    if max_vocabulary:
+        return PrunedCountVectorizer(
+            max_vocabulary=max_vocabulary, prune_min_count=prune_min_count, **params
+        )
+    return CountVectorizer(**params)
+
+
 class BERTopicWrapper:
     def __init__(
         self,
@@ -90,6 +125,11 @@ class BERTopicWrapper:
         hdbscan_params: Optional[HDBSCANParams] = None,
         verbose: bool = False,
     ) -> None:
+        # modeling libraries are slow to import, load them on first use
+        from bertopic import BERTopic
+        from hdbscan import HDBSCAN
+        from umap import UMAP
+
         self.language = language
         self.top_n_words = top_n_words
         self.nr_topics = nr_topics
@@ -102,7 +142,7 @@ class BERTopicWrapper:
 
         # Vectorizer
         self.vectorizer_model = (
-            CountVectorizer(**self.vectorizer_params.dict()) if self.vectorizer_params else None
+            build_vectorizer(self.vectorizer_params) if self.vectorizer_params else None
         )
 
         # UMAP
@@ -122,3 +162,14 @@ class BERTopicWrapper:
             hdbscan_model=self.hdbscan_model,
             verbose=self.verbose,
         )
+        self.clamp_jobs()
+
+    def clamp_jobs(self) -> None:
+        """Limit UMAP and HDBSCAN parallelism, including their defaults, to the thread budget"""
+        n_threads = thread_budget.threads
+        umap_model = self.model.umap_model
+        if hasattr(umap_model, "n_jobs"):
+            umap_model.n_jobs = clamp_jobs(umap_model.n_jobs, n_threads)
+        hdbscan_model = self.model.hdbscan_model
+        if hasattr(hdbscan_model, "core_dist_n_jobs"):
+            hdbscan_model.core_dist_n_jobs = clamp_jobs(hdbscan_model.core_dist_n_jobs, n_threads)
@@ -0,0 +1,212 @@
+"""
+Offline batch scoring of a Parquet or CSV file with a trained model.
+
+The serving model is downloaded once and saved uncompressed to a temporary file, every worker
+process memory-maps its arrays, so they are shared through the page cache. The input is read in
+chunks scored in parallel, topics are written in input order to a Parquet file, one row group per
+chunk, e.g. for 4 workers keeping the `id` column:
+
+    python -m service.score <model_id> texts.parquet topics.parquet --workers 4 --keep-columns id
+"""
+from typing import TYPE_CHECKING, Any, Deque, Iterator, List, Optional, Sequence, Tuple
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import numpy.typing as npt
+from fastapi.exceptions import HTTPException
+
+from .api.deps import create_s3_client
+from .api.utils import deduplicate, load_model
+from .core.threads import available_cpus, limit_threads
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+    from bertopic import BERTopic
+
+# chunks queued for workers per worker, bounds memory used by pending input and results
+QUEUED_CHUNKS = 2
+
+# model and thread limit of the worker process, set by init_worker
+_model: Optional["BERTopic"] = None
+_threads = 1
+
+
+def init_worker(model_path: str, threads: int) -> None:
+    global _model, _threads
+    _model = joblib.load(model_path, mmap_mode="r")
+    _threads = threads
+
+
+def score_chunk(
+    texts: List[str], calculate_probabilities: bool
+) -> Tuple[npt.NDArray[np.int64], Optional[npt.NDArray[np.floating[Any]]]]:
+    """Topics and probabilities of texts with the model of the worker, duplicates scored once"""
+    assert _model is not None, "worker is not initialized"
+    unique, inverse = deduplicate(texts)
+    _model.calculate_probabilities = calculate_probabilities
+    with limit_threads(_threads):
+        topics, probabilities = _model.transform(unique)
+    topics = np.asarray(topics, dtype=np.int64)[inverse]
+    return topics, probabilities[inverse] if calculate_probabilities else None
+
+
+def read_chunks(
+    path: str, text_column: str, columns: Sequence[str], chunk_size: int
+) -> Iterator["pa.Table"]:
+    """`columns` of a Parquet or CSV file by `chunk_size` rows, by extension"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if path.endswith(".csv"):
+        import pandas as pd
+
+        for frame in pd.read_csv(
+            path, usecols=list(columns), chunksize=chunk_size, dtype={text_column: str}
+        ):
+            yield pa.Table.from_pandas(frame, preserve_index=False)
+    else:
+        parquet_file = pq.ParquetFile(path)
+        batches = parquet_file.iter_batches(batch_size=chunk_size, columns=list(columns))
+        batch = None
+        for batch in batches:
+            yield pa.Table.from_batches([batch])
+        if batch is None:
+            # empty files give the schema of the output
+            yield parquet_file.schema_arrow.empty_table().select(list(columns))
+
+
+def make_result(
+    chunk: "pa.Table",
+    keep_columns: Sequence[str],
+    topics: npt.NDArray[np.int64],
+    probabilities: Optional[npt.NDArray[np.floating[Any]]],
+) -> "pa.Table":
+    import pyarrow as pa
+
+    columns = {column: chunk.column(column) for column in keep_columns}
+    columns["topic"] = pa.array(topics)
+    if probabilities is not None:
+        columns["probabilities"] = pa.FixedSizeListArray.from_arrays(
+            pa.array(probabilities.astype(np.float32).ravel()), probabilities.shape[1]
+        )
+    return pa.table(columns)
+
+
+def score_file(
+    model_path: str,
+    input_path: str,
+    output_path: str,
+    text_column: str = "text",
+    keep_columns: Sequence[str] = (),
+    chunk_size: int = 10_000,
+    workers: int = 1,
+    calculate_probabilities: bool = False,
+) -> int:
+    """Score `input_path` with the model saved by joblib to `model_path`, returns scored rows"""
+    import pyarrow.parquet as pq
+
+    columns = list(dict.fromkeys([text_column, *keep_columns]))
+    # CPUs are split between workers, each one runs single chunk at a time
+    threads = max(1, available_cpus() // workers)
+    writer: Optional[pq.ParquetWriter] = None
+    pending: Deque[Tuple["pa.Table", "Future[Any]"]] = deque()
+    empty: Optional["pa.Table"] = None
+    rows = 0
+    start = time.perf_counter()
+
+    def write_next() -> None:
+        nonlocal writer, rows
+        chunk, future = pending.popleft()
+        result = make_result(chunk, keep_columns, *future.result())
+        if writer is None:
+            writer = pq.ParquetWriter(output_path, result.schema)
+        writer.write_table(result)
+        rows += result.num_rows
+        elapsed = time.perf_counter() - start
+        print(f"{rows} rows scored, {rows / elapsed:.1f} rows/s", file=sys.stderr)
+
+    # forked workers could inherit locks of torch and BLAS thread pools of this process
+    with ProcessPoolExecutor(
+        workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(model_path, threads),
+    ) as pool:
+        try:
+            for chunk in read_chunks(input_path, text_column, columns, chunk_size):
+                if chunk.num_rows == 0:
+                    empty = chunk
+                    continue
+                texts = [text or "" for text in chunk.column(text_column).to_pylist()]
+                pending.append((chunk, pool.submit(score_chunk, texts, calculate_probabilities)))
+                if len(pending) >= QUEUED_CHUNKS * workers:
+                    write_next()
+            while pending:
+                write_next()
+        finally:
+            if writer is not None:
+                writer.close()
+    if writer is None and empty is not None:
+        probabilities = np.empty((0, 0), np.float32) if calculate_probabilities else None
+        result = make_result(empty, keep_columns, np.empty(0, np.int64), probabilities)
+        pq.write_table(result, output_path)
+    return rows
+
+
+async def fetch_model(model_id: uuid.UUID, version: int, path: str) -> None:
+    """Save the serving variant of the model uncompressed, so its arrays can be memory-mapped"""
+    async with create_s3_client() as s3:
+        topic_model = await load_model(s3, model_id, version, serving=True)
+    joblib.dump(topic_model, path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("model_id", type=uuid.UUID)
+    parser.add_argument("input", help="Parquet file, or CSV file with .csv extension")
+    parser.add_argument("output", help="Parquet file with topics of input rows in order")
+    parser.add_argument("--version", type=int, default=1)
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--keep-columns", nargs="*", default=[], help="Input columns to copy")
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, default=available_cpus())
+    parser.add_argument("--probabilities", action="store_true", help="Add topic probabilities")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = os.path.join(directory, "model.joblib")
+        try:
+            asyncio.run(fetch_model(args.model_id, args.version, model_path))
+        except HTTPException as e:
+            sys.exit(f"{args.model_id} version {args.version}: {e.detail}")
+        start = time.perf_counter()
+        rows = score_file(
+            model_path,
+            args.input,
+            args.output,
+            text_column=args.text_column,
+            keep_columns=args.keep_columns,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            calculate_probabilities=args.probabilities,
+        )
+    elapsed = time.perf_counter() - start
+    print(
+        f"Scored {rows} rows in {elapsed:.1f}s, {rows / max(elapsed, 1e-9):.1f} rows/s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
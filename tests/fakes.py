@@ -0,0 +1,173 @@
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Optional
+
+import asyncio
+import os
+import tempfile
+import uuid
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+class NoSuchKey(ClientError):
+    def __init__(self, key: str) -> None:
+        super().__init__({"Error": {"Code": "NoSuchKey", "Message": key}}, "GetObject")
+
+
+class FakeStream:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+    async def __aenter__(self) -> "FakeStream":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    async def read(self, amt: Optional[int] = None) -> bytes:
+        data, self.data = (self.data, b"") if amt is None else (self.data[:amt], self.data[amt:])
+        return data
+
+
+class FakeExceptions:
+    NoSuchKey = NoSuchKey
+
+
+class FakeS3:
+    """In-process stand-in for the aiobotocore S3 client, only implements calls used by service"""
+
+    exceptions = FakeExceptions
+
+    def __init__(self, latency: float = 0) -> None:
+        # seconds added to every request transferring data, like a round trip to remote storage
+        self.latency = latency
+        self.objects: Dict[str, Dict[str, Any]] = {}
+        self.uploads: Dict[str, Dict[int, bytes]] = {}
+        self.upload_metadata: Dict[str, Dict[str, str]] = {}
+
+    def _get(self, key: str) -> Dict[str, Any]:
+        if key not in self.objects:
+            raise NoSuchKey(key)
+        return self.objects[key]
+
+    async def put_object(
+        self, *, Bucket: str, Key: str, Body: bytes, Metadata: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        self.objects[Key] = {
+            "Body": bytes(Body),
+            "Metadata": Metadata or {},
+            "LastModified": datetime.now(timezone.utc),
+        }
+        return {}
+
+    async def get_object(
+        self, *, Bucket: str, Key: str, Range: Optional[str] = None
+    ) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        data = self._get(Key)["Body"]
+        if Range is not None:
+            # only "bytes=start-end" ranges are used
+            start, end = map(int, Range[len("bytes=") :].split("-"))
+            data = data[start : end + 1]
+        return {"Body": FakeStream(data), "ContentLength": len(data)}
+
+    async def create_multipart_upload(
+        self, *, Bucket: str, Key: str, Metadata: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        upload_id = str(uuid.uuid4())
+        self.uploads[upload_id] = {}
+        self.upload_metadata[upload_id] = Metadata or {}
+        return {"UploadId": upload_id}
+
+    async def upload_part(
+        self, *, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes
+    ) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        self.uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    async def complete_multipart_upload(
+        self, *, Bucket: str, Key: str, UploadId: str, MultipartUpload: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        parts = self.uploads.pop(UploadId)
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        self.objects[Key] = {
+            "Body": b"".join(parts[number] for number in numbers),
+            "Metadata": self.upload_metadata.pop(UploadId),
+            "LastModified": datetime.now(timezone.utc),
+        }
+        return {}
+
+    async def abort_multipart_upload(
+        self, *, Bucket: str, Key: str, UploadId: str
+    ) -> Dict[str, Any]:
+        self.uploads.pop(UploadId, None)
+        self.upload_metadata.pop(UploadId, None)
+        return {}
+
+    async def head_object(self, *, Bucket: str, Key: str) -> Dict[str, Any]:
+        obj = self._get(Key)
+        return {
+            "ContentLength": len(obj["Body"]),
+            "Metadata": obj["Metadata"],
+            "LastModified": obj["LastModified"],
+        }
+
+    async def delete_object(self, *, Bucket: str, Key: str) -> Dict[str, Any]:
+        self.objects.pop(Key, None)
+        return {}
+
+    async def delete_objects(self, *, Bucket: str, Delete: Dict[str, Any]) -> Dict[str, Any]:
+        for obj in Delete["Objects"]:
+            self.objects.pop(obj["Key"], None)
+        return {}
+
+    def get_paginator(self, operation: str) -> "FakePaginator":
+        return FakePaginator(self)
+
+
+class FakePaginator:
+    """Paginator of list_objects_v2, pages are limited to `page_size` objects"""
+
+    def __init__(self, s3: FakeS3, page_size: int = 1000) -> None:
+        self.s3 = s3
+        self.page_size = page_size
+
+    async def paginate(self, *, Bucket: str, Prefix: str = "") -> AsyncIterator[Dict[str, Any]]:
+        keys = sorted(key for key in self.s3.objects if key.startswith(Prefix))
+        for start in range(0, len(keys), self.page_size):
+            # objects are looked up lazily, deletes between pages are visible like in S3
+            page = [key for key in keys[start : start + self.page_size] if key in self.s3.objects]
+            yield {
+                "Contents": [
+                    {
+                        "Key": key,
+                        "Size": len(self.s3.objects[key]["Body"]),
+                        "LastModified": self.s3.objects[key]["LastModified"],
+                    }
+                    for key in page
+                ]
+            }
+
+
+class SQLiteDatabase:
+    """Temporary SQLite database with the service schema, replaces Postgres in tests and benchmarks"""
+
+    def __init__(self) -> None:
+        fd, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.engine = create_engine(f"sqlite:///{self.path}")
+        self.engine_async = create_async_engine(f"sqlite+aiosqlite:///{self.path}")
+        SQLModel.metadata.create_all(self.engine)
+
+    async def get_db_async(self) -> AsyncGenerator[AsyncSession, None]:
+        async with AsyncSession(self.engine_async) as session:
+            yield session
+
+    def close(self) -> None:
+        self.engine.dispose()
+        os.remove(self.path)
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+from fastapi.exceptions import HTTPException
+
+from service.core.admission import AdmissionController
+
+pytestmark = pytest.mark.unit
+
+
+def test_admission() -> None:
+    controller = AdmissionController("test", concurrency=1, queue_size=1)
+    release = asyncio.Event()
+    order = []
+
+    async def request(name: str) -> None:
+        async with controller.slot():
+            order.append(name)
+            await release.wait()
+
+    async def run() -> None:
+        running = asyncio.create_task(request("running"))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(request("queued"))
+        await asyncio.sleep(0)
+        assert (controller.active, controller.waiting) == (1, 1)
+
+        with pytest.raises(HTTPException) as e:
+            await request("rejected")
+        rejected: HTTPException = e.value
+        assert rejected.status_code == 503
+        assert rejected.headers is not None and "Retry-After" in rejected.headers
+
+        release.set()
+        await asyncio.gather(running, queued)
+        assert (controller.active, controller.waiting) == (0, 0)
+
+    asyncio.run(run())
+    assert order == ["running", "queued"]
@@ -0,0 +1,98 @@
+from typing import Any, Dict, List
+
+import collections
+import uuid
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from service.api import affinity as api_affinity
+from service.core import affinity
+from service.core.config import settings
+
+pytestmark = pytest.mark.unit
+
+PEERS = ["http://localhost:8001", "http://localhost:8002", "http://localhost:8003"]
+
+
+def test_owners() -> None:
+    keys = [(uuid.uuid4(), version) for version in (1, 2) for _ in range(1500)]
+    assigned = {key: affinity.owners(*key, PEERS) for key in keys}
+    assert all(len(owners) == 1 for owners in assigned.values())
+    # every peer gets about a third of the models
+    counts = collections.Counter(owners[0] for owners in assigned.values())
+    assert all(800 < counts[peer] < 1200 for peer in PEERS)
+    # the order of peers doesn't matter
+    assert all(affinity.owners(*key, PEERS[::-1]) == assigned[key] for key in keys)
+
+    # only models of a removed peer move
+    for key, owners in assigned.items():
+        remaining = affinity.owners(*key, PEERS[1:])
+        assert remaining == owners or owners == [PEERS[0]]
+
+    # replicas are the first owners, every model is served by a bounded number of peers
+    for key, owners in assigned.items():
+        assert affinity.owners(*key, PEERS, replicas=2)[:1] == owners
+
+
+def model_owned_by(peer: str) -> uuid.UUID:
+    while True:
+        model_id = uuid.uuid4()
+        if affinity.owners(model_id, 1, PEERS) == [peer]:
+            return model_id
+
+
+def test_route_model(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(affinity, "peer_set", affinity.PeerSet(PEERS))
+    monkeypatch.setattr(settings, "AFFINITY_SELF", PEERS[0])
+    forwarded: List[httpx.Request] = []
+    reachable = True
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if not reachable:
+            raise httpx.ConnectError("Connection refused", request=request)
+        forwarded.append(request)
+        return httpx.Response(200, json={"served_by": str(request.url)})
+
+    monkeypatch.setattr(
+        api_affinity, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+
+    app = FastAPI()
+    app.add_exception_handler(api_affinity.Forwarded, api_affinity.forwarded_response)
+
+    @app.post("/predict", dependencies=[Depends(api_affinity.route_model)])
+    async def predict(data: Dict[str, Any]) -> Dict[str, Any]:
+        return {"served_by": "local"}
+
+    client = TestClient(app)
+    local = {"model": {"model_id": str(model_owned_by(PEERS[0]))}, "texts": ["a"]}
+    assert client.post("/predict", json=local).json() == {"served_by": "local"}
+    assert not forwarded
+
+    remote = {"model": {"model_id": str(model_owned_by(PEERS[1])), "version": 1}, "texts": ["a"]}
+    response = client.post("/predict?limit=1", json=remote)
+    assert response.json() == {"served_by": f"{PEERS[1]}/predict?limit=1"}
+    assert forwarded[0].headers[api_affinity.HOP_HEADER] == PEERS[0]
+    assert httpx.Response(200, content=forwarded[0].content).json() == remote
+
+    # forwarded requests and requests without a model are served where they arrive
+    headers = {api_affinity.HOP_HEADER: PEERS[2]}
+    assert client.post("/predict", json=remote, headers=headers).json() == {"served_by": "local"}
+    assert client.post("/predict", json={"texts": ["a"]}).json() == {"served_by": "local"}
+    assert len(forwarded) == 1
+
+    # without a reachable owner the request is served here
+    reachable = False
+    assert client.post("/predict", json=remote).json() == {"served_by": "local"}
+
+    # bodies that aren't JSON are left to validation, with and without routing
+    for self_address in [PEERS[0], None]:
+        monkeypatch.setattr(settings, "AFFINITY_SELF", self_address)
+        assert client.post("/predict").status_code == 422
+        text = {"Content-Type": "text/plain"}
+        assert client.post("/predict", content=b"texts", headers=text).status_code == 422
+        assert client.post("/predict", content=b"{", headers=text).status_code == 422
+    assert len(forwarded) == 1
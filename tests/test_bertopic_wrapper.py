@@ -1,9 +1,15 @@
+from typing import Any, Dict, List
+
 import pytest
 from bertopic import BERTopic
 from hdbscan import HDBSCAN
+from pydantic import ValidationError
+from pytest_mock import MockFixture
 from sklearn.feature_extraction.text import CountVectorizer
 from umap import UMAP
 
+from service.core.threads import ThreadBudget
+from service.core.vectorizers import HashedCountVectorizer, PrunedCountVectorizer
 from service.schemas.bertopic_wrapper import (
     BERTopicWrapper,
     HDBSCANParams,
@@ -32,6 +38,36 @@ class TestBERTopicWrapper:
         for param, value in vectorizer_params.items():
             assert getattr(wrapper.vectorizer_model, param) == value
 
+    def test_init_bounded_vectorizer(self) -> None:
+        wrapper = BERTopicWrapper(
+            vectorizer_params=VectorizerParams(ngram_range=[1, 3], n_features=2**10)
+        )
+        assert type(wrapper.vectorizer_model) == HashedCountVectorizer
+        assert wrapper.vectorizer_model.n_features == 2**10
+        assert wrapper.vectorizer_model.ngram_range == [1, 3]
+
+        wrapper = BERTopicWrapper(
+            vectorizer_params=VectorizerParams(max_vocabulary=100, prune_min_count=3)
+        )
+        assert type(wrapper.vectorizer_model) == PrunedCountVectorizer
+        assert wrapper.vectorizer_model.get_params()["max_vocabulary"] == 100
+        assert wrapper.vectorizer_model.prune_min_count == 3
+
+        with pytest.raises(ValidationError):
+            VectorizerParams(n_features=2**10, max_vocabulary=100)
+        # parameters of the full vocabulary are rejected instead of ignored
+        invalid: List[Dict[str, Any]] = [
+            {"max_vocabulary": 100, "min_df": 2},
+            {"max_vocabulary": 100, "max_features": 100},
+            {"max_vocabulary": 100, "vocabulary": ["goal"]},
+            {"n_features": 2**10, "max_df": 0.5},
+            {"max_vocabulary": 100, "prune_min_count": None},
+        ]
+        for params in invalid:
+            with pytest.raises(ValidationError):
+                VectorizerParams.parse_obj(params)
+        assert VectorizerParams.parse_obj({"n_features": 2**10, "max_df": 1.0, "min_df": 1})
+
     def test_init_umap(self) -> None:
         umap_params = {
             "n_neighbors": 50,
@@ -57,3 +93,15 @@ class TestBERTopicWrapper:
         assert type(wrapper.hdbscan_model) == HDBSCAN
         for param, value in hdbscan_params.items():
             assert getattr(wrapper.hdbscan_model, param) == value
+
+    def test_clamp_jobs(self, mocker: MockFixture) -> None:
+        mocker.patch("service.schemas.bertopic_wrapper.thread_budget", ThreadBudget(2))
+        wrapper = BERTopicWrapper(
+            umap_params=UMAPParams(n_jobs=-1), hdbscan_params=HDBSCANParams(core_dist_n_jobs=8)
+        )
+        assert wrapper.model.umap_model.n_jobs == 2
+        assert wrapper.model.hdbscan_model.core_dist_n_jobs == 2
+        # defaults created by BERTopic are clamped too
+        wrapper = BERTopicWrapper()
+        assert wrapper.model.umap_model.n_jobs == 2
+        assert wrapper.model.hdbscan_model.core_dist_n_jobs == 2
@@ -0,0 +1,57 @@
+from typing import Any, AsyncGenerator, Generator
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from pytest_mock import MockFixture
+
+from service.api import deps
+from service.main import app
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture()
+def s3(mocker: MockFixture) -> Generator[Any, None, None]:
+    s3 = mocker.AsyncMock()
+    session = mocker.AsyncMock()
+
+    async def get_s3() -> AsyncGenerator[Any, None]:
+        yield s3
+
+    async def get_db_async() -> AsyncGenerator[Any, None]:
+        yield session
+
+    app.dependency_overrides[deps.get_s3] = get_s3
+    app.dependency_overrides[deps.get_db_async] = get_db_async
+    yield s3
+    app.dependency_overrides.clear()
+
+
+def test_live(client: TestClient) -> None:
+    response = client.get("/health/live")
+    assert response.status_code == 200
+    assert response.json() == {"message": "ok"}
+
+
+def wait_warmup() -> None:
+    for _ in range(100):
+        if app.state.warmup.done():
+            return
+        time.sleep(0.1)
+
+
+def test_ready(client: TestClient, s3: Any) -> None:
+    wait_warmup()
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    s3.head_bucket.assert_awaited_once()
+
+
+def test_not_ready(client: TestClient, s3: Any) -> None:
+    s3.head_bucket.side_effect = ConnectionError("no route to host")
+    wait_warmup()
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert "no route to host" in response.json()["message"]
@@ -0,0 +1,28 @@
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from service.core.metrics import current_endpoint, timed
+
+pytestmark = pytest.mark.unit
+
+
+def test_timed() -> None:
+    labels = {"endpoint": "/test", "stage": "work"}
+    before = REGISTRY.get_sample_value("bertopic_stage_seconds_count", labels) or 0
+    token = current_endpoint.set("/test")
+    with timed("work"):
+        pass
+    current_endpoint.reset(token)
+    assert REGISTRY.get_sample_value("bertopic_stage_seconds_count", labels) == before + 1
+
+
+def test_metrics(client: TestClient) -> None:
+    client.get("/docs")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'bertopic_request_seconds_count{endpoint="/docs",method="GET",status="200"}' in (
+        response.text
+    )
+    assert "bertopic_requests_in_flight" in response.text
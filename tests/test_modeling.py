@@ -1,9 +1,25 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import asyncio
+import uuid
+
+import numpy as np
 import pytest
 from fastapi.testclient import TestClient
+from pytest_mock import MockFixture
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-pytestmark = pytest.mark.slow
+from service import crud
+from service.api import utils
+from service.api.endpoints.modeling import embed_documents, persist_model
+from service.core.config import settings
+from service.core.vectorizers import PrunedCountVectorizer
+from service.models.models import ModelChunk, Topic, TopicModel
+from tests.fakes import FakeS3, SQLiteDatabase
 
 
+@pytest.mark.slow
 def test_fit(client: TestClient) -> None:
     response = client.post("/modeling/training", json={"texts": []})
     assert response.status_code == 200
@@ -16,3 +32,100 @@ def test_fit(client: TestClient) -> None:
     assert len(response_json["predictions"]["topics"]) == len(
         response_json["predictions"]["probabilities"]
     )
+
+
+@pytest.mark.unit
+def test_embed_documents(mocker: MockFixture) -> None:
+    mocker.patch(
+        "bertopic.backend._utils.select_backend", side_effect=lambda model, language: model
+    )
+    topic_model = mocker.MagicMock()
+    topic_model._extract_embeddings.side_effect = lambda texts, **kwargs: np.array(
+        [[ord(text)] for text in texts]
+    )
+    texts = ["a", "b", "a", "c", "b"]
+    embeddings = embed_documents(topic_model, texts)
+    # duplicates are embedded once
+    assert topic_model._extract_embeddings.call_args.args[0] == ["a", "b", "c"]
+    assert embeddings.ravel().tolist() == [ord(text) for text in texts]
+
+
+class FakeTopicModel:
+    umap_model = hdbscan_model = vectorizer_model = None
+    topic_labels_ = {0: "0_goal_match"}
+    topic_sizes_ = {0: 2}
+
+    def get_topics(self) -> Dict[int, List[Tuple[str, float]]]:
+        return {0: [("goal", 0.5), ("match", 0.25)]}
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("failure", [None, "upload", "write"])
+def test_persist_model(mocker: MockFixture, failure: Optional[str]) -> None:
+    s3 = FakeS3()
+    database = SQLiteDatabase()
+    if failure == "upload":
+        mocker.patch.object(s3, "put_object", side_effect=OSError)
+    if failure == "write":
+        mocker.patch.object(crud.topic, "save_topics", side_effect=OSError)
+    model_id = uuid.uuid4()
+
+    async def persist() -> None:
+        async with AsyncSession(database.engine_async) as session:
+            await persist_model(s3, session, FakeTopicModel(), model_id)
+
+    try:
+        if failure is None:
+            asyncio.run(persist())
+        else:
+            with pytest.raises(OSError):
+                asyncio.run(persist())
+        with Session(database.engine) as session:
+            versions = session.exec(select(TopicModel)).all()
+            topics = session.exec(select(Topic)).all()
+            chunks = session.exec(select(ModelChunk)).all()
+    finally:
+        database.close()
+
+    if failure is None:
+        assert len(versions) == 1 and len(topics) == 1
+        assert {chunk.digest for chunk in chunks} == {
+            key[len(settings.CHUNK_PREFIX) :] for key in s3.objects if "/" in key
+        }
+        assert utils.get_model_filename(model_id) in s3.objects
+    else:
+        # nothing is left but chunks, they are garbage collected
+        assert not versions and not topics and not chunks
+        assert all(key.startswith(settings.CHUNK_PREFIX) for key in s3.objects)
+
+
+@pytest.mark.unit
+def test_update_topics(client: TestClient, mocker: MockFixture) -> None:
+    topic_model = mocker.MagicMock(topics_=[0, 1, 0])
+    mocker.patch("service.api.endpoints.modeling.load_model", return_value=topic_model)
+    mocker.patch.object(crud.topic_model, "get_max_version", return_value=2)
+    persist = mocker.patch("service.api.endpoints.modeling.persist_model")
+    model_id = uuid.uuid4()
+    model: Dict[str, Any] = {"model_id": str(model_id), "version": 1}
+    url = f"/modeling/{model_id}/updating"
+
+    response = client.post(url, json={"model": model, "texts": ["a", "b"]})
+    assert response.status_code == 400
+
+    texts = ["goal scored", "graphics card", "match ended"]
+    response = client.post(
+        url,
+        json={
+            "model": model,
+            "texts": texts,
+            "top_n_words": 5,
+            "vectorizer_params": {"stop_words": "english", "max_vocabulary": 1000},
+        },
+    )
+    assert response.status_code == 200
+    assert response.json() == {**model, "version": 3}
+    args, kwargs = topic_model.update_topics.call_args
+    # stored topics of the training documents are kept
+    assert args == (texts,) and kwargs["topics"] is None and kwargs["top_n_words"] == 5
+    assert isinstance(kwargs["vectorizer_model"], PrunedCountVectorizer)
+    assert persist.call_args.args[2:] == (topic_model, model_id, 3)
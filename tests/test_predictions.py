@@ -0,0 +1,102 @@
+from typing import Any, AsyncIterator
+
+import uuid
+from contextlib import asynccontextmanager
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from pytest_mock import MockFixture
+
+from service.core.predictions import ENTRY_OVERHEAD, PredictionCache, prediction_cache
+
+pytestmark = pytest.mark.unit
+
+
+def test_prediction_cache() -> None:
+    cache = PredictionCache(max_bytes=2 * (ENTRY_OVERHEAD + 16))
+    probabilities = np.array([[0.9, 0.1], [0.2, 0.8], [0.5, 0.5]])
+    cache.put("model", ["a", "b"], True, [0, 1], probabilities[:2])
+    assert cache.get("model", ["a", "b"], False) == [None, None]
+    assert cache.get("other", ["a"], True) == [None]
+    hit, missing = cache.get("model", ["a", "c"], True)
+    assert hit is not None and missing is None
+    topic, row = hit
+    assert topic == 0 and row is not None and np.array_equal(row, probabilities[0])
+
+    # "a" was used last, "b" is evicted to stay within the budget
+    cache.put("model", ["c"], True, [0], probabilities[2:])
+    assert [prediction is not None for prediction in cache.get("model", "abc", True)] == [
+        True,
+        False,
+        True,
+    ]
+    assert cache.used == 2 * (ENTRY_OVERHEAD + 16)
+
+    cache.discard("model")
+    assert not cache.entries and cache.used == 0
+
+
+def test_predict_cached_documents(client: TestClient, mocker: MockFixture) -> None:
+    mocker.patch.dict(prediction_cache.entries, clear=True)
+    topic_model = mocker.MagicMock()
+    topic_model._extract_embeddings.side_effect = lambda texts, **kwargs: np.ones((len(texts), 4))
+    topic_model.transform.side_effect = lambda texts, embeddings: (
+        [len(text) for text in texts],
+        np.ones((len(texts), 2)),
+    )
+    use_model = mocker.patch("service.api.endpoints.modeling.use_model")
+    use_model.return_value.__aenter__.return_value = topic_model
+
+    model = {"model_id": str(uuid.uuid4()), "version": 1}
+    for texts in [["a", "bb", "a"], ["ccc", "bb", "a", "ccc"]]:
+        response = client.post(
+            f"/modeling/{model['model_id']}/predicting",
+            json={"model": model, "texts": texts, "calculate_probabilities": True},
+        )
+        assert response.status_code == 200
+        assert response.json()["topics"] == [len(text) for text in texts]
+    # only distinct new documents were sent to the model
+    assert [call.args[0] for call in topic_model.transform.call_args_list] == [
+        ["a", "bb"],
+        ["ccc"],
+    ]
+
+
+def test_predict_many_models(client: TestClient, mocker: MockFixture) -> None:
+    mocker.patch.dict(prediction_cache.entries, clear=True)
+    embedding_model = object()
+    models = {}
+    for n_topics in [2, 3]:
+        # reduced versions of one base model share its embedding model
+        topic_model = mocker.MagicMock(embedding_model=embedding_model)
+        topic_model._extract_embeddings.side_effect = lambda texts, **kwargs: np.ones(
+            (len(texts), 4)
+        )
+        topic_model.transform.side_effect = lambda texts, embeddings, n=n_topics: (
+            [n] * len(texts),
+            np.ones((len(texts), n)) / n,
+        )
+        models[str(uuid.uuid4())] = topic_model
+
+    @asynccontextmanager
+    async def use_model(model_id: uuid.UUID, version: int) -> AsyncIterator[Any]:
+        yield models[str(model_id)]
+
+    mocker.patch("service.api.endpoints.modeling.use_model", use_model)
+    response = client.post(
+        "/modeling/predicting",
+        json={
+            "models": [{"model_id": model_id} for model_id in models],
+            "texts": ["a", "b"],
+            "calculate_probabilities": True,
+        },
+    )
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["model"]["model_id"] for result in results] == list(models)
+    assert [result["predictions"]["topics"] for result in results] == [[2, 2], [3, 3]]
+    assert [len(result["predictions"]["probabilities"][0]) for result in results] == [2, 3]
+    first, second = models.values()
+    first._extract_embeddings.assert_called_once()
+    second._extract_embeddings.assert_not_called()
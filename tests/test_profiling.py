@@ -0,0 +1,57 @@
+import marshal
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pytest_mock import MockFixture
+
+from service.api.profiling import ProfilingMiddleware
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture()
+def profiled_client() -> TestClient:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping() -> str:
+        return "pong"
+
+    app.add_middleware(ProfilingMiddleware)
+    return TestClient(app=app)
+
+
+def test_profiling(profiled_client: TestClient, mocker: MockFixture) -> None:
+    s3 = mocker.AsyncMock()
+    create_s3_client = mocker.patch("service.api.profiling.create_s3_client")
+    create_s3_client.return_value.__aenter__.return_value = s3
+
+    response = profiled_client.get("/ping", headers={"X-Profile": "1"})
+    assert response.status_code == 200
+    key = response.headers["X-Profile-Key"]
+    assert key.startswith("profiles/") and key.endswith(".prof")
+    s3.put_object.assert_awaited_once()
+    assert s3.put_object.await_args.kwargs["Key"] == key
+    assert marshal.loads(s3.put_object.await_args.kwargs["Body"])
+
+
+def test_profiling_upload_failure(profiled_client: TestClient, mocker: MockFixture) -> None:
+    s3 = mocker.AsyncMock()
+    s3.put_object.side_effect = OSError
+    create_s3_client = mocker.patch("service.api.profiling.create_s3_client")
+    create_s3_client.return_value.__aenter__.return_value = s3
+
+    response = profiled_client.get("/ping", headers={"X-Profile": "1"})
+    assert response.status_code == 200 and response.json() == "pong"
+    # the key would point to a missing profile
+    assert "X-Profile-Key" not in response.headers
+
+
+def test_no_profiling_without_header(profiled_client: TestClient, mocker: MockFixture) -> None:
+    create_s3_client = mocker.patch("service.api.profiling.create_s3_client")
+
+    response = profiled_client.get("/ping")
+    assert response.status_code == 200
+    assert "X-Profile-Key" not in response.headers
+    create_s3_client.assert_not_called()
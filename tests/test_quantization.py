@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import io
+
+import joblib
+import numpy as np
+import pytest
+
+from service.core.quantization import quantize
+
+pytestmark = pytest.mark.unit
+
+
+def joblib_bytes(obj: object) -> bytes:
+    with io.BytesIO() as f:
+        joblib.dump(obj, f)
+        return f.getvalue()
+
+
+def roundtrip(obj: object) -> SimpleNamespace:
+    with io.BytesIO(joblib_bytes(obj)) as f:
+        restored: SimpleNamespace = joblib.load(f)
+    return restored
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_quantize(precision: str) -> None:
+    rng = np.random.default_rng(0)
+    raw_data = rng.normal(size=(100, 32)).astype(np.float32)
+    raw_data[0] = 0
+    umap_model = SimpleNamespace(_raw_data=raw_data, embedding_=rng.normal(size=(100, 5)))
+    model = SimpleNamespace(topic_embeddings_=rng.normal(size=(4, 32)), topic_sizes_=np.ones(4))
+
+    quantized, restored_bytes = quantize("umap_model", umap_model, precision)
+    # the saved model is not modified
+    assert quantized is not umap_model and umap_model._raw_data is raw_data
+    restored = roundtrip(quantized)
+    assert restored._raw_data.dtype == np.float32 and restored.embedding_.dtype == np.float64
+    # float16 keeps 11 significant bits, int8 127 steps of the largest value of a row
+    tolerance = 2**-10 if precision == "float16" else 1 / 127
+    for name in ("_raw_data", "embedding_"):
+        original, value = getattr(umap_model, name), getattr(restored, name)
+        bound = tolerance * np.abs(original).max(axis=1, keepdims=True)
+        assert np.all(np.abs(value - original) <= bound)
+    assert not restored._raw_data[0].any()
+    stored = len(joblib_bytes(quantized))
+    assert stored < len(joblib_bytes(umap_model)) <= stored + restored_bytes + 1024
+
+    quantized, _ = quantize("model", model, precision)
+    restored = roundtrip(quantized)
+    # topic embeddings are only used by cosine similarity, float16 ones aren't upcast
+    assert restored.topic_embeddings_.dtype == (
+        np.float16 if precision == "float16" else np.float32
+    )
+    assert np.allclose(restored.topic_embeddings_, model.topic_embeddings_, atol=0.05)
+    assert restored.topic_sizes_ is not model.topic_sizes_
+    assert np.array_equal(restored.topic_sizes_, model.topic_sizes_)
+
+    assert quantize("umap_model", umap_model, "full") == (umap_model, 0)
+    assert quantize("hdbscan_model", umap_model, precision) == (umap_model, 0)
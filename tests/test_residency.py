@@ -0,0 +1,202 @@
+from typing import Any, List
+
+import asyncio
+
+import numpy as np
+import pytest
+from fastapi.exceptions import HTTPException
+from fastapi.testclient import TestClient
+from pytest_mock import MockFixture
+
+from service.core.residency import ResidencyManager, deep_sizeof, residency
+
+pytestmark = pytest.mark.unit
+
+MB = 2**20
+
+
+def test_deep_sizeof() -> None:
+    array = np.zeros(MB, dtype=np.uint8)
+    assert MB <= deep_sizeof({"a": array, "b": array[:10], "c": [array]}) < 2 * MB
+
+
+def test_evicts_idle_models() -> None:
+    manager = ResidencyManager(budget=3 * MB)
+    loads: List[str] = []
+
+    async def use(key: str) -> None:
+        async def load() -> Any:
+            loads.append(key)
+            return np.zeros(MB, dtype=np.uint8)
+
+        async def estimate() -> int:
+            return MB
+
+        async with manager.use(key, load, estimate):
+            pass
+
+    async def run() -> None:
+        for key in ["a", "b", "c", "a", "d", "b"]:
+            await use(key)
+
+    asyncio.run(run())
+    # "b" was the least recently used when "d" was loaded
+    assert loads == ["a", "b", "c", "d", "b"]
+    assert manager.used <= 3 * MB
+
+
+def test_waits_for_models_in_use() -> None:
+    manager = ResidencyManager(budget=MB + MB // 2)
+    events: List[str] = []
+
+    async def use(key: str, hold: float) -> None:
+        async def load() -> Any:
+            events.append(f"load {key}")
+            return np.zeros(MB, dtype=np.uint8)
+
+        async def estimate() -> int:
+            return MB
+
+        async with manager.use(key, load, estimate):
+            await asyncio.sleep(hold)
+            events.append(f"release {key}")
+
+    async def run() -> None:
+        await asyncio.gather(use("a", 0.1), use("b", 0))
+
+    asyncio.run(run())
+    assert events == ["load a", "release a", "load b", "release b"]
+
+
+def test_loads_beside_permanent_models() -> None:
+    manager = ResidencyManager(budget=10 * MB)
+    manager.add("permanent", np.zeros(8 * MB, dtype=np.uint8), permanent=True)
+    manager.add("idle", np.zeros(MB, dtype=np.uint8))
+
+    async def load() -> Any:
+        return np.zeros(4 * MB, dtype=np.uint8)
+
+    async def estimate() -> int:
+        return 4 * MB
+
+    async def run() -> None:
+        async with manager.use("a", load, estimate) as model:
+            assert model.nbytes == 4 * MB
+            assert list(manager.residents) == ["permanent", "a"]
+
+    # permanent models are never evicted, the load doesn't wait for them
+    asyncio.run(asyncio.wait_for(run(), timeout=1))
+    # models over the budget are evicted once idle
+    assert list(manager.residents) == ["permanent"]
+
+
+def test_resident_models(client: TestClient, mocker: MockFixture) -> None:
+    mocker.patch.dict(residency.residents, clear=True)
+    residency.add(("8e6ef3b4-5ee4-4d7b-96b4-a1dbe1ed9a33", 1), np.zeros(MB), permanent=True)
+    response = client.get("/admin/models")
+    assert response.status_code == 200
+    info = response.json()
+    assert info["budget"] == residency.budget
+    assert info["models"][0]["model_id"] == "8e6ef3b4-5ee4-4d7b-96b4-a1dbe1ed9a33"
+    assert info["models"][0]["size"] >= 8 * MB
+    assert info["models"][0]["permanent"]
+
+
+def test_coalesces_concurrent_loads() -> None:
+    manager = ResidencyManager(budget=2 * MB)
+    loads = 0
+
+    async def load() -> Any:
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return np.zeros(MB, dtype=np.uint8)
+
+    async def estimate() -> int:
+        return MB
+
+    async def use() -> Any:
+        async with manager.use("a", load, estimate) as model:
+            return model
+
+    async def run() -> List[Any]:
+        return list(await asyncio.gather(*(use() for _ in range(10))))
+
+    models = asyncio.run(run())
+    assert loads == 1
+    assert all(model is models[0] for model in models)
+    assert not manager.loading
+
+
+def test_propagates_load_errors() -> None:
+    manager = ResidencyManager(budget=MB)
+
+    async def load() -> Any:
+        await asyncio.sleep(0.01)
+        raise HTTPException(status_code=404, detail="Model not found")
+
+    async def estimate() -> int:
+        return 0
+
+    async def use() -> None:
+        async with manager.use("a", load, estimate):
+            pass
+
+    async def run() -> List[Any]:
+        return await asyncio.gather(*(use() for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(run())
+    assert all(isinstance(e, HTTPException) and e.status_code == 404 for e in errors)
+    assert not manager.loading and not manager.residents
+
+
+def test_discards_removed_models() -> None:
+    manager = ResidencyManager(budget=3 * MB)
+    manager.add("a", np.zeros(MB, dtype=np.uint8), permanent=True)
+    manager.add("c", np.zeros(MB, dtype=np.uint8))
+
+    async def load() -> Any:
+        return np.zeros(MB, dtype=np.uint8)
+
+    async def estimate() -> int:
+        return MB
+
+    async def run() -> None:
+        async with manager.use("b", load, estimate) as model:
+            await manager.discard("a", "b", "missing")
+            # the request keeps using the model
+            assert model.nbytes == MB
+        assert "b" not in manager
+
+    asyncio.run(run())
+    assert list(manager.residents) == ["c"]
+    assert manager.used == deep_sizeof(manager.residents["c"].model)
+
+
+def test_discards_models_being_loaded() -> None:
+    manager = ResidencyManager(budget=2 * MB)
+
+    async def load() -> Any:
+        await asyncio.sleep(0.01)
+        return np.zeros(MB, dtype=np.uint8)
+
+    async def estimate() -> int:
+        return MB
+
+    async def use() -> Any:
+        async with manager.use("a", load, estimate) as model:
+            return model
+
+    async def run() -> List[Any]:
+        first = asyncio.ensure_future(use())
+        await asyncio.sleep(0)
+        # the version is removed once loaded, before the waiting requests resume
+        manager.loading["a"].add_done_callback(
+            lambda _: asyncio.ensure_future(manager.discard("a"))
+        )
+        second = asyncio.ensure_future(use())
+        return list(await asyncio.gather(first, second))
+
+    models = asyncio.run(run())
+    assert models[0] is models[1] and models[0].nbytes == MB
+    assert "a" not in manager
@@ -0,0 +1,60 @@
+from typing import List, Tuple
+
+from pathlib import Path
+
+import joblib
+import numpy as np
+import numpy.typing as npt
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.parquet as pq
+import pytest
+
+from service.score import score_file
+
+pytestmark = pytest.mark.unit
+
+
+class LengthModel:
+    """Picklable stand-in for BERTopic assigning texts to topics by length"""
+
+    calculate_probabilities = False
+
+    def __init__(self) -> None:
+        self.centers = np.arange(3, dtype=np.float64)
+
+    def transform(self, documents: List[str]) -> Tuple[List[int], npt.NDArray[np.float64]]:
+        topics = [len(document) % 3 for document in documents]
+        probabilities = np.eye(3)[topics] if self.calculate_probabilities else np.ones(len(topics))
+        return topics, probabilities
+
+
+@pytest.mark.parametrize("extension", ["parquet", "csv"])
+def test_score_file(tmp_path: Path, extension: str) -> None:
+    model_path = str(tmp_path / "model.joblib")
+    joblib.dump(LengthModel(), model_path)
+    texts = ["a" * (i % 7) + "b" for i in range(25)]
+    table = pa.table({"id": list(range(25)), "text": texts})
+    input_path = str(tmp_path / f"input.{extension}")
+    if extension == "csv":
+        pyarrow.csv.write_csv(table, input_path)
+    else:
+        pq.write_table(table, input_path)
+    output_path = str(tmp_path / "output.parquet")
+
+    rows = score_file(
+        model_path,
+        input_path,
+        output_path,
+        keep_columns=["id"],
+        chunk_size=10,
+        workers=2,
+        calculate_probabilities=True,
+    )
+    assert rows == 25
+    result = pq.read_table(output_path)
+    assert result.column_names == ["id", "topic", "probabilities"]
+    assert result.column("id").to_pylist() == list(range(25))
+    topics = [len(text) % 3 for text in texts]
+    assert result.column("topic").to_pylist() == topics
+    assert np.array_equal(np.array(result.column("probabilities").to_pylist()), np.eye(3)[topics])
@@ -0,0 +1,61 @@
+from typing import List
+
+import asyncio
+
+import pytest
+from pytest_mock import MockFixture
+
+from service.core import storage
+from tests.fakes import FakeS3
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture()
+def multipart(mocker: MockFixture) -> None:
+    mocker.patch("service.core.storage.settings.S3_MULTIPART_THRESHOLD", 10)
+    mocker.patch("service.core.storage.settings.S3_PART_SIZE", 4)
+    mocker.patch("service.core.storage.settings.S3_CONCURRENCY", 2)
+
+
+@pytest.mark.parametrize("data", [b"small", bytes(range(10)), bytes(range(23))])
+def test_upload_download(multipart: None, mocker: MockFixture, data: bytes) -> None:
+    s3 = FakeS3()
+    get_object = mocker.spy(s3, "get_object")
+    upload_part = mocker.spy(s3, "upload_part")
+
+    asyncio.run(storage.upload(s3, "key", data, {"codec": "none"}))
+    assert s3.objects["key"]["Body"] == data
+    assert asyncio.run(storage.download(s3, "key")) == (data, {"codec": "none"})
+    assert storage.BufferReader(bytearray(data)).read() == data
+
+    n_parts = 1 if len(data) < 10 else (len(data) + 3) // 4
+    assert get_object.call_count == n_parts
+    assert upload_part.call_count == (n_parts if n_parts > 1 else 0)
+    assert not s3.uploads
+
+
+def test_abort_failed_upload(multipart: None, mocker: MockFixture) -> None:
+    s3 = FakeS3()
+    mocker.patch.object(s3, "upload_part", side_effect=OSError)
+    with pytest.raises(OSError):
+        asyncio.run(storage.upload(s3, "key", bytes(20)))
+    assert not s3.uploads
+    assert "key" not in s3.objects
+
+
+def test_delete_in_batches(mocker: MockFixture) -> None:
+    mocker.patch("service.core.storage.DELETE_BATCH", 2)
+    s3 = FakeS3()
+    for key in ["a", "b", "c", "profiles/d"]:
+        asyncio.run(s3.put_object(Bucket="", Key=key, Body=b""))
+    delete_objects = mocker.spy(s3, "delete_objects")
+
+    assert asyncio.run(storage.delete(s3, ["a", "b", "c", "missing"])) == []
+    assert delete_objects.call_count == 2
+
+    async def list_keys(prefix: str) -> List[str]:
+        return [obj["Key"] async for page in storage.list_objects(s3, prefix) for obj in page]
+
+    assert asyncio.run(list_keys("")) == ["profiles/d"]
+    assert asyncio.run(list_keys("chunks/")) == []
@@ -0,0 +1,164 @@
+from typing import Any, Dict, List
+
+import gzip
+import json
+import struct
+import tracemalloc
+
+import pytest
+import zstandard
+from fastapi import FastAPI
+from fastapi.exceptions import HTTPException
+from fastapi.routing import APIRouter
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from pytest_mock import MockFixture
+
+from service.api.decompression import DecompressionMiddleware, Decompressor
+from service.api.streaming import StreamedRoute, StreamParser
+from service.core.config import settings
+
+pytestmark = pytest.mark.unit
+
+
+class Texts(BaseModel):
+    texts: List[str]
+    top_n_words: int = 10
+
+
+@pytest.fixture()
+def streamed_client() -> TestClient:
+    app = FastAPI()
+    router = APIRouter(route_class=StreamedRoute)
+
+    @router.post("/texts")
+    async def post_texts(data: Texts) -> Dict[str, Any]:
+        return data.dict()
+
+    app.include_router(router)
+    app.add_middleware(DecompressionMiddleware)
+    return TestClient(app=app)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 2**16])
+def test_stream_parser(chunk_size: int) -> None:
+    body = {
+        "language": "english",
+        "texts": ["a", 'é "quoted" \\ ☃ 😀', "", 1],
+        "nr_topics": -3.5,
+        "vectorizer_params": {"ngram_range": [1, 2], "binary": True},
+    }
+    for data in [json.dumps(body, indent=1), json.dumps(body, ensure_ascii=False)]:
+        parser = StreamParser(max_length=20)
+        raw = data.encode()
+        for start in range(0, len(raw), chunk_size):
+            parser.feed(raw[start : start + chunk_size])
+        parser.feed(b"", final=True)
+        assert parser.result == body
+
+
+def test_stream_parser_long_values(mocker: MockFixture) -> None:
+    mocker.patch.object(settings, "REQUEST_BODY_LIMIT", 10_000)
+    # other values than texts aren't limited to the text length
+    body = {"texts": ["a"], "probabilities": [[0.25, 0.75]] * 500}
+    raw = json.dumps(body).encode()
+    parser = StreamParser(max_length=10)
+    raw_decode = mocker.spy(parser.decoder, "raw_decode")
+    for start in range(0, len(raw), 10):
+        parser.feed(raw[start : start + 10])
+    parser.feed(b"", final=True)
+    assert parser.result == body
+    # incomplete values aren't decoded again on every chunk
+    assert raw_decode.call_count < 20
+
+    raw = json.dumps({"probabilities": [[0.25, 0.75]] * 1000}).encode()
+    parser = StreamParser(max_length=10)
+    with pytest.raises(HTTPException):
+        for start in range(0, len(raw), 100):
+            parser.feed(raw[start : start + 100])
+
+
+@pytest.mark.parametrize(
+    "data", [b'{"texts": ["a" "b"]}', b'{"texts": ["a",]}', b'{"texts": ["a"]', b'{"a": 1} 2']
+)
+def test_stream_parser_errors(data: bytes) -> None:
+    parser = StreamParser()
+    with pytest.raises(json.JSONDecodeError):
+        parser.feed(data)
+        parser.feed(b"", final=True)
+
+
+@pytest.mark.parametrize("encoding", [None, "gzip", "zstd"])
+def test_streamed_body(streamed_client: TestClient, encoding: str) -> None:
+    body = json.dumps({"texts": ["first", "second"], "top_n_words": 5}).encode()
+    headers = {"Content-Type": "application/json"}
+    if encoding == "gzip":
+        # concatenated members are one body
+        body = gzip.compress(body[:10]) + gzip.compress(body[10:])
+    if encoding == "zstd":
+        # skippable frames are ignored
+        skippable = struct.pack("<II", 0x184D2A5F, 3) + b"abc"
+        compressor = zstandard.ZstdCompressor(write_checksum=True)
+        body = compressor.compress(body[:10]) + skippable + compressor.compress(body[10:])
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    response = streamed_client.post("/texts", content=body, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"texts": ["first", "second"], "top_n_words": 5}
+
+    # validation errors are reported as usual
+    response = streamed_client.post("/texts", json={"texts": [[]]})
+    assert response.status_code == 422
+    assert streamed_client.post("/texts", content=b'{"texts": ["a"],}').status_code == 422
+    assert streamed_client.post("/texts").status_code == 422
+
+
+def test_streamed_body_limits(streamed_client: TestClient, mocker: MockFixture) -> None:
+    mocker.patch.object(settings, "TEXT_MAX_LENGTH", 10)
+    mocker.patch.object(settings, "REQUEST_BODY_LIMIT", 1000)
+    response = streamed_client.post("/texts", json={"texts": ["short", "x" * 11]})
+    assert response.status_code == 413
+    assert response.json()["detail"] == "texts[1] is longer than 10 characters"
+
+    headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    body = gzip.compress(json.dumps({"texts": ["short"] * 200}).encode())
+    response = streamed_client.post("/texts", content=body, headers=headers)
+    assert response.status_code == 413
+
+    body = gzip.compress(b'{"texts": ["short"]}')
+    response = streamed_client.post("/texts", content=body[:-4], headers=headers)
+    assert response.status_code == 400
+    headers["Content-Encoding"] = "br"
+    assert streamed_client.post("/texts", content=body, headers=headers).status_code == 415
+
+
+def zstd_bomb(blocks: int) -> bytes:
+    """Frame of RLE blocks, every one 4 bytes decompressing to 128 KiB"""
+    # descriptor without content size and a 128 KiB window
+    frame = struct.pack("<I", 0xFD2FB528) + bytes([0, 7 << 3])
+    for i in range(blocks):
+        header = 2**17 << 3 | 1 << 1 | (i == blocks - 1)
+        frame += header.to_bytes(3, "little") + b"a"
+    return frame
+
+
+def test_zstd_bomb(streamed_client: TestClient, mocker: MockFixture) -> None:
+    decompressed = zstandard.ZstdDecompressor().decompressobj().decompress(zstd_bomb(3))
+    assert decompressed == b"a" * 3 * 2**17
+
+    mocker.patch.object(settings, "REQUEST_BODY_LIMIT", 2**20)
+    # 3 KiB decompressing to 100 MB is rejected once the limit is reached, not at its end
+    tracemalloc.start()
+    try:
+        with pytest.raises(HTTPException):
+            Decompressor("zstd").decompress(zstd_bomb(800))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 4 * 2**20
+
+    headers = {"Content-Type": "application/json", "Content-Encoding": "zstd"}
+    response = streamed_client.post("/texts", content=zstd_bomb(800), headers=headers)
+    assert response.status_code == 413
+    body = zstandard.ZstdCompressor().compress(b'{"texts": ["short"]}')
+    assert streamed_client.post("/texts", content=body[:-3], headers=headers).status_code == 400
@@ -0,0 +1,18 @@
+import pytest
+from threadpoolctl import threadpool_info
+
+from service.core.threads import ThreadBudget, clamp_jobs
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.mark.parametrize("n_jobs, limit", [(None, 4), (-1, 4), (8, 4), (0, 1), (2, 2)])
+def test_clamp_jobs(n_jobs: int, limit: int) -> None:
+    assert clamp_jobs(n_jobs, 4) == limit
+
+
+def test_thread_budget() -> None:
+    budget = ThreadBudget(1)
+    with budget.job() as n_threads:
+        assert n_threads == 1
+        assert all(pool["num_threads"] == 1 for pool in threadpool_info())
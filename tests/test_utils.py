@@ -0,0 +1,286 @@
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, List
+
+import asyncio
+import io
+import uuid
+from contextlib import asynccontextmanager
+
+import joblib
+import numpy as np
+import pytest
+from bertopic import BERTopic
+from pytest_mock import MockFixture
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from service import crud
+from service.api import utils
+from service.api.warmup import preload_models
+from service.core.residency import residency
+from service.models.models import TopicModelBase
+from tests.fakes import FakeS3, SQLiteDatabase
+
+pytestmark = pytest.mark.unit
+
+
+def test_deduplicate() -> None:
+    texts = ["a", "b", "a", "c", "b"]
+    unique, inverse = utils.deduplicate(texts)
+    assert unique == ["a", "b", "c"]
+    assert [unique[i] for i in inverse] == texts
+
+
+def test_preload_models(mocker: MockFixture) -> None:
+    model_id = uuid.uuid4()
+    model = object()
+    mocker.patch("service.api.warmup.settings.PRELOAD_MODELS", [(model_id, 2)])
+    mocker.patch("service.api.warmup.create_s3_client")
+    load_model = mocker.patch("service.api.warmup.load_model", return_value=model)
+    mocker.patch.dict(residency.residents, clear=True)
+
+    preload_models()
+    preload_models()
+    load_model.assert_awaited_once()
+    assert list(residency.residents) == [(model_id, 2)]
+    assert residency.residents[(model_id, 2)].permanent
+
+    async def use() -> object:
+        async with utils.use_model(model_id, 2) as topic_model:
+            return topic_model
+
+    create_s3_client = mocker.patch("service.api.deps.create_s3_client")
+    assert asyncio.run(use()) is model
+    create_s3_client.assert_not_called()
+
+    s3 = mocker.AsyncMock()
+    s3.head_object.return_value = {"ContentLength": 5}
+    mocker.patch("service.api.utils.joblib.load", return_value="copy")
+    body = mocker.MagicMock()
+    body.__aenter__.return_value.read = mocker.AsyncMock(return_value=b"model")
+    s3.get_object.return_value = {"Body": body}
+    assert asyncio.run(utils.load_model(s3, model_id, 2)) == "copy"
+
+
+def test_use_model_outlives_request(mocker: MockFixture) -> None:
+    model_id = uuid.uuid4()
+    mocker.patch.dict(residency.residents, clear=True)
+    clients: List[SimpleNamespace] = []
+
+    @asynccontextmanager
+    async def create_s3_client() -> AsyncIterator[SimpleNamespace]:
+        s3 = SimpleNamespace(closed=False)
+        clients.append(s3)
+        yield s3
+        s3.closed = True
+
+    async def load_model(s3: SimpleNamespace, *args: Any, **kwargs: Any) -> str:
+        await asyncio.sleep(0.01)
+        assert not s3.closed
+        return "model"
+
+    mocker.patch("service.api.deps.create_s3_client", create_s3_client)
+    mocker.patch("service.api.utils.get_model_size", return_value=0)
+    mocker.patch("service.api.utils.load_model", load_model)
+
+    async def use() -> object:
+        async with utils.use_model(model_id) as topic_model:
+            return topic_model
+
+    async def run() -> object:
+        first = asyncio.ensure_future(use())
+        second = asyncio.ensure_future(use())
+        await asyncio.sleep(0.001)
+        # the request starting the load goes away, the waiting one still gets the model
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "model"
+    assert clients and all(s3.closed for s3 in clients)
+
+
+@pytest.mark.parametrize("codec", ["none", "lz4", "zstd"])
+def test_model_codecs(mocker: MockFixture, codec: str) -> None:
+    mocker.patch("service.api.utils.settings.MODEL_CODEC", codec)
+    s3 = FakeS3()
+    model = SimpleNamespace(
+        embeddings=np.zeros((100, 10)), umap_model=None, hdbscan_model=None, vectorizer_model=None
+    )
+    model_id, chunks = asyncio.run(utils.save_model(s3, model))
+
+    stored = [s3.objects[utils.get_chunk_filename(digest)] for digest in chunks]
+    assert all(chunk["Metadata"]["codec"] == codec for chunk in stored)
+    size = sum(int(chunk["Metadata"]["size"]) for chunk in stored)
+    if codec != "none":
+        assert sum(len(chunk["Body"]) for chunk in stored) < size
+    loaded = asyncio.run(utils.load_model(s3, model_id))
+    assert np.array_equal(loaded.embeddings, model.embeddings)
+    assert 0 < asyncio.run(utils.get_model_size(s3, model_id)) <= size
+
+
+def test_load_uncompressed_model() -> None:
+    # artifacts saved before codecs were introduced have no codec metadata
+    s3 = FakeS3()
+    model_id = uuid.uuid4()
+    with io.BytesIO() as f:
+        joblib.dump({"topics": [1, 2]}, f)
+        asyncio.run(
+            s3.put_object(Bucket="", Key=utils.get_model_filename(model_id), Body=f.getvalue())
+        )
+    assert asyncio.run(utils.load_model(s3, model_id)) == {"topics": [1, 2]}
+    # models saved before serving variants existed are served from the full artifact
+    assert asyncio.run(utils.load_model(s3, model_id, serving=True)) == {"topics": [1, 2]}
+
+
+def test_model_chunks() -> None:
+    s3 = FakeS3()
+    model = SimpleNamespace(
+        topics_=[0, 1], umap_model=np.zeros((100, 10)), hdbscan_model=None, vectorizer_model=None
+    )
+    model_id, first = asyncio.run(utils.save_model(s3, model))
+    model.topics_ = [1, 1]
+    _, second = asyncio.run(utils.save_model(s3, model, model_id, 2))
+    # only the model itself changed, sub-models are shared between versions
+    shared = set(first) & set(second)
+    assert shared and set(first) != set(second)
+    assert asyncio.run(utils.load_model(s3, model_id, 2)).topics_ == [1, 1]
+
+    unreferenced = set(first) - shared
+    asyncio.run(utils.delete_models(s3, [(model_id, 1)], unreferenced))
+    assert utils.get_model_filename(model_id, 1) not in s3.objects
+    assert all(utils.get_chunk_filename(digest) not in s3.objects for digest in unreferenced)
+    assert asyncio.run(utils.load_model(s3, model_id, 2)).topics_ == [1, 1]
+
+
+class Embedder:
+    def __init__(self) -> None:
+        self.weights = np.ones(10)
+
+
+def test_share_embedding_models() -> None:
+    s3 = FakeS3()
+    model = SimpleNamespace(
+        embedding_model=Embedder(), umap_model=None, hdbscan_model=None, vectorizer_model=None
+    )
+    model_id, _ = asyncio.run(utils.save_model(s3, model))
+    model.topics_ = [1]
+    asyncio.run(utils.save_model(s3, model, model_id, 2))
+
+    first = asyncio.run(utils.load_model(s3, model_id, 1, serving=True))
+    second = asyncio.run(utils.load_model(s3, model_id, 2, serving=True))
+    assert first.embedding_model is second.embedding_model
+    # full models are private copies that can be modified
+    full = asyncio.run(utils.load_model(s3, model_id, 2))
+    assert full.embedding_model is not second.embedding_model
+
+
+def test_lock_chunks(mocker: MockFixture) -> None:
+    session = mocker.AsyncMock()
+    session.connection.return_value.dialect.name = "postgresql"
+    asyncio.run(crud.model_chunk.lock(session, shared=True))
+    asyncio.run(crud.model_chunk.lock(session))
+    assert [str(call.args[0]) for call in session.execute.call_args_list] == [
+        "SELECT pg_advisory_xact_lock_shared(:key)",
+        "SELECT pg_advisory_xact_lock(:key)",
+    ]
+
+    # other databases have no advisory locks
+    session.execute.reset_mock()
+    session.connection.return_value.dialect.name = "sqlite"
+    asyncio.run(crud.model_chunk.lock(session))
+    session.execute.assert_not_called()
+
+
+def test_remove_models(mocker: MockFixture) -> None:
+    mocker.patch("service.api.utils.settings.ARTIFACT_GC_GRACE", -1)
+    s3 = FakeS3()
+    database = SQLiteDatabase()
+
+    async def remove() -> None:
+        async with AsyncSession(database.engine_async) as session:
+            model = SimpleNamespace(
+                topics_=[0], umap_model=np.zeros(10), hdbscan_model=None, vectorizer_model=None
+            )
+            model_ids = []
+            # unrelated models still share chunks of equal sub-models
+            for _ in range(2):
+                model_id, chunks = await utils.save_model(s3, model)
+                version = await crud.topic_model.create(
+                    session, obj_in=TopicModelBase(model_id=model_id)
+                )
+                assert version.id is not None
+                await crud.model_chunk.create_many(
+                    session, topic_model_id=version.id, digests=chunks
+                )
+                model_ids.append(model_id)
+            # orphans left by a failed fit and a version removed before chunks existed
+            orphan, _ = await utils.save_model(s3, model)
+            await s3.put_object(Bucket="", Key=utils.get_model_filename(uuid.uuid4()), Body=b"")
+            await s3.put_object(Bucket="", Key="profiles/predict.html", Body=b"")
+
+            versions, chunks = await crud.topic_model.remove_many(session, model_id=model_ids[0])
+            assert versions == [(model_ids[0], 1)]
+            # removed versions aren't reused by new versions of the model
+            assert await crud.topic_model.get_max_version(session, model_id=model_ids[0]) == 1
+            await crud.model_chunk.lock(session)
+            referenced = await crud.model_chunk.get_referenced(session, digests=chunks)
+            await utils.delete_models(s3, versions, set(chunks) - referenced)
+            await session.commit()
+            assert utils.get_model_filename(model_ids[0]) not in s3.objects
+            assert (await utils.load_model(s3, model_ids[1])).topics_ == [0]
+
+            assert (await utils.collect_garbage(s3, session))[0] == 3
+            assert utils.get_model_filename(orphan) not in s3.objects
+            assert "profiles/predict.html" in s3.objects
+            assert (await utils.load_model(s3, model_ids[1])).topics_ == [0]
+            assert await utils.collect_garbage(s3, session) == (0, 0)
+
+    try:
+        asyncio.run(remove())
+    finally:
+        database.close()
+
+
+def test_serving_model(dummy_model: BERTopic) -> None:
+    docs = [
+        "The match ended in a draw after extra time",
+        "New graphics cards were announced at the conference",
+        "The senate passed the budget bill",
+    ]
+    serving_model = utils.make_serving_model(dummy_model)
+    assert dummy_model.topics_ and not serving_model.topics_
+    assert serving_model.umap_model.graph_ is None
+
+    for calculate_probabilities in [False, True]:
+        dummy_model.calculate_probabilities = calculate_probabilities
+        serving_model.calculate_probabilities = calculate_probabilities
+        topics, probabilities = dummy_model.transform(docs)
+        serving_topics, serving_probabilities = serving_model.transform(docs)
+        assert serving_topics == topics
+        if calculate_probabilities:
+            assert np.allclose(serving_probabilities, probabilities)
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_embedding_precision(dummy_model: BERTopic, mocker: MockFixture, precision: str) -> None:
+    words = [word for topic in dummy_model.get_topics().values() for word, _ in topic]
+    rng = np.random.default_rng(0)
+    docs = [" ".join(rng.choice(words, size=30)) for _ in range(200)]
+    dummy_model.calculate_probabilities = True
+    topics, probabilities = dummy_model.transform(docs)
+
+    s3 = FakeS3()
+    full_id, full_chunks = asyncio.run(utils.save_model(s3, dummy_model))
+    mocker.patch("service.api.utils.settings.EMBEDDING_PRECISION", precision)
+    model_id, chunks = asyncio.run(utils.save_model(s3, dummy_model))
+    stored = {
+        digest: len(s3.objects[utils.get_chunk_filename(digest)]["Body"])
+        for digest in full_chunks + chunks
+    }
+    assert sum(stored[digest] for digest in chunks) < sum(stored[d] for d in full_chunks)
+
+    serving_model = asyncio.run(utils.load_model(s3, model_id, serving=True))
+    serving_model.calculate_probabilities = True
+    reduced_topics, reduced_probabilities = serving_model.transform(docs)
+    # predictions stay within tolerance of full precision
+    assert np.mean(np.array(reduced_topics) == np.array(topics)) >= 0.98
+    assert np.abs(reduced_probabilities - probabilities).mean() < 0.02
@@ -0,0 +1,57 @@
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer
+
+from service.core.vectorizers import HashedCountVectorizer, PrunedCountVectorizer
+
+pytestmark = pytest.mark.unit
+
+DOCS = ["the cat sat on the mat", "the dog sat", "cats and dogs and the cat"]
+
+
+def test_hashed_vectorizer() -> None:
+    expected = CountVectorizer(ngram_range=(1, 2))
+    counts = expected.fit_transform(DOCS)
+    vectorizer = HashedCountVectorizer(n_features=2**20, ngram_range=(1, 2))
+    X = vectorizer.fit_transform(DOCS)
+    # without collisions columns match the vocabulary up to their order
+    order = [expected.vocabulary_[word] for word in vectorizer.get_feature_names_out()]
+    assert (X != counts[:, order]).nnz == 0
+    assert (
+        vectorizer.transform(["the cat", "unseen"])
+        != expected.transform(["the cat", "unseen"])[:, order]
+    ).nnz == 0
+
+
+def test_hashed_vectorizer_collisions() -> None:
+    vectorizer = HashedCountVectorizer(n_features=2)
+    X = vectorizer.fit_transform(DOCS)
+    assert X.shape[1] <= 2
+    # every token is counted and buckets are named after their most frequent token
+    assert X.sum() == CountVectorizer().fit_transform(DOCS).sum()
+    assert "the" in vectorizer.get_feature_names_out()
+
+
+def test_pruned_vectorizer() -> None:
+    vectorizer = PrunedCountVectorizer(max_vocabulary=100)
+    expected = CountVectorizer()
+    assert (vectorizer.fit_transform(DOCS) != expected.fit_transform(DOCS)).nnz == 0
+    assert list(vectorizer.get_feature_names_out()) == list(expected.get_feature_names_out())
+
+    # over 4 tokens are pruned after the first document, keeping only "the", so the later "cat"
+    # is counted once and "and" is kept with "the"
+    vectorizer = PrunedCountVectorizer(max_vocabulary=2, prune_min_count=2)
+    vectorizer.fit(DOCS)
+    assert list(vectorizer.get_feature_names_out()) == ["and", "the"]
+    assert vectorizer.transform(["the cat and the dog"]).toarray().tolist() == [[1, 2]]
+
+    # tokens counted once fill the vocabulary when there is room, it is never empty
+    tokens = [f"token{i}" for i in range(11)]
+    vectorizer = PrunedCountVectorizer(max_vocabulary=10)
+    vectorizer.fit([" ".join(tokens + ["token10"])])
+    assert len(vectorizer.get_feature_names_out()) == 10
+    assert "token10" in vectorizer.get_feature_names_out()
+    vectorizer = PrunedCountVectorizer(max_vocabulary=5)
+    X = vectorizer.fit_transform(
+        ["alpha beta gamma delta epsilon zeta eta theta iota kappa lambda"]
+    )
+    assert len(vectorizer.get_feature_names_out()) == 5 and X.sum() == 5
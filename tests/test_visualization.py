@@ -1,17 +1,28 @@
+from typing import Any
+
+import json
 import uuid
 
+import plotly.graph_objects as go
 import pytest
 from bertopic import BERTopic
 from fastapi.testclient import TestClient
 from plotly.io import from_json
 from pytest_mock import MockFixture
 
+from service.api.endpoints.visualization import figure_response
+
+
+def patch_model(mocker: MockFixture, topic_model: Any) -> None:
+    use_model = mocker.patch("service.api.endpoints.visualization.use_model")
+    use_model.return_value.__aenter__.return_value = topic_model
+
 
 @pytest.mark.unit
 class TestVisualizers:
     def test_topics(self, client: TestClient, dummy_model: BERTopic, mocker: MockFixture) -> None:
         mocker.patch("service.api.endpoints.visualization.check_topics")
-        mocker.patch("service.api.endpoints.visualization.load_model", return_value=dummy_model)
+        patch_model(mocker, dummy_model)
         response = client.post(
             "/visualizations/topics",
             json={
@@ -22,7 +33,7 @@ class TestVisualizers:
             },
         )
         assert response.status_code == 200
-        fig = from_json(response.json())
+        fig = from_json(response.text)
         assert fig["layout"]["width"] == 500
         assert fig["layout"]["height"] == 500
         assert fig["data"][0]["type"] == "scatter"
@@ -33,7 +44,7 @@ class TestVisualizers:
         self, client: TestClient, dummy_model: BERTopic, mocker: MockFixture
     ) -> None:
         mocker.patch("service.api.endpoints.visualization.check_topics")
-        mocker.patch("service.api.endpoints.visualization.load_model", return_value=dummy_model)
+        patch_model(mocker, dummy_model)
         response = client.post(
             "/visualizations/barchart",
             json={
@@ -45,7 +56,7 @@ class TestVisualizers:
             },
         )
         assert response.status_code == 200
-        fig = from_json(response.json())
+        fig = from_json(response.text)
         assert len(fig["data"]) == 2
         assert fig["data"][0]["type"] == "bar"
         assert fig["data"][0]["y"] == ("is  ", "to  ", "the  ")
@@ -56,7 +67,7 @@ class TestVisualizers:
         self, client: TestClient, dummy_model: BERTopic, mocker: MockFixture
     ) -> None:
         mocker.patch("service.api.endpoints.visualization.check_topics")
-        mocker.patch("service.api.endpoints.visualization.load_model", return_value=dummy_model)
+        patch_model(mocker, dummy_model)
         response = client.post(
             "/visualizations/hierarchy",
             json={
@@ -67,7 +78,7 @@ class TestVisualizers:
             },
         )
         assert response.status_code == 200
-        fig = from_json(response.json())
+        fig = from_json(response.text)
         assert fig["data"][0]["mode"] == "lines"
         assert fig["data"][0]["type"] == "scatter"
         assert fig["layout"]["width"] == 500
@@ -75,7 +86,7 @@ class TestVisualizers:
 
     def test_heatmap(self, client: TestClient, dummy_model: BERTopic, mocker: MockFixture) -> None:
         mocker.patch("service.api.endpoints.visualization.check_topics")
-        mocker.patch("service.api.endpoints.visualization.load_model", return_value=dummy_model)
+        patch_model(mocker, dummy_model)
         response = client.post(
             "/visualizations/heatmap",
             json={
@@ -86,7 +97,7 @@ class TestVisualizers:
             },
         )
         assert response.status_code == 200
-        fig = from_json(response.json())
+        fig = from_json(response.text)
         assert fig["layout"]["width"] == 500
         assert fig["layout"]["height"] == 500
         assert fig["data"][0]["type"] == "heatmap"
@@ -97,7 +108,7 @@ class TestVisualizers:
         self, client: TestClient, dummy_model: BERTopic, mocker: MockFixture
     ) -> None:
         mocker.patch("service.api.endpoints.visualization.check_topics")
-        mocker.patch("service.api.endpoints.visualization.load_model", return_value=dummy_model)
+        patch_model(mocker, dummy_model)
         response = client.post(
             "/visualizations/distribution",
             json={
@@ -109,7 +120,7 @@ class TestVisualizers:
             },
         )
         assert response.status_code == 200
-        fig = from_json(response.json())
+        fig = from_json(response.text)
         assert fig["data"][0]["type"] == "bar"
         assert fig["data"][0]["x"] == (0.33, 0.41)
         assert fig["data"][0]["y"] == (
@@ -123,7 +134,7 @@ class TestVisualizers:
         self, client: TestClient, dummy_model: BERTopic, mocker: MockFixture
     ) -> None:
         mocker.patch("service.api.endpoints.visualization.check_topics")
-        mocker.patch("service.api.endpoints.visualization.load_model", return_value=dummy_model)
+        patch_model(mocker, dummy_model)
         response = client.post(
             "/visualizations/term_rank",
             json={
@@ -135,7 +146,7 @@ class TestVisualizers:
             },
         )
         assert response.status_code == 200
-        fig = from_json(response.json())
+        fig = from_json(response.text)
         assert fig["layout"]["width"] == 500
         assert fig["layout"]["height"] == 500
         assert len(fig["data"]) == 4
@@ -143,3 +154,26 @@ class TestVisualizers:
         assert fig["data"][0]["hovertext"] == "<b>Topic -1</b>:the_and_to_of_that_you_for_in_it_i"
         assert fig["data"][1]["type"] == "scatter"
         assert fig["data"][1]["hovertext"] == "<b>Topic 0</b>:the_to_is_for_and_you_it_of_with_in"
+
+    def test_strip_template(self, mocker: MockFixture) -> None:
+        mocker.patch("service.api.endpoints.visualization.settings.STRIP_PLOTLY_TEMPLATE", True)
+        response = figure_response(go.Figure(go.Bar(x=[1, 2], y=[3, 4])))
+        assert response.media_type == "application/json"
+        fig = json.loads(response.body)
+        assert fig["data"][0]["type"] == "bar"
+        assert "template" not in fig["layout"]
+
+    @pytest.mark.parametrize("encoding", ["br", "gzip"])
+    def test_compression(self, client: TestClient, mocker: MockFixture, encoding: str) -> None:
+        topic_model = mocker.Mock()
+        topic_model.visualize_topics.return_value = go.Figure(go.Bar(x=[1, 2], y=[3, 4]))
+        mocker.patch("service.api.endpoints.visualization.check_topics")
+        patch_model(mocker, topic_model)
+        response = client.post(
+            "/visualizations/topics",
+            json={"model": {"model_id": str(uuid.uuid4()), "version": 1}, "topics": [0]},
+            headers={"Accept-Encoding": encoding},
+        )
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == encoding
+        assert from_json(response.text)["data"][0]["type"] == "bar"